@@ -0,0 +1,181 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from figure_io import read_figure
+
+# Headless batch export of saved figures (CSV or .spf) to PNG images and SVG paths.
+# Usage: python batch_render.py figures/ other.csv --output-dir out [--jobs 8] [--format png svg]
+# Every figure is loaded, tessellated and drawn in a worker process, without a pygame window
+# or the Tk panel. Workers only receive file paths and write their own outputs, so the work
+# scales with the number of cores. A JSON summary with per-file timings is written next to
+# the outputs. Outputs are named after the figure's path below the directory common to all
+# inputs, extension included (sub/fig.csv -> sub/fig.csv.png), so fig.csv and fig.spf, or
+# figures of the same name in different directories, don't overwrite each other.
+
+FIGURE_PATTERNS = ('*.csv', '*.spf')
+CANVAS_SIZE = (1080, 720)  # Size of the editor window, figure coordinates are its pixels
+
+def find_figures(paths):
+    figures = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in FIGURE_PATTERNS:
+                figures.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            figures.append(path)
+    return sorted(set(figures))
+
+def output_names(figures):
+    # Output name (without the format's extension) of every figure, unique for unique paths
+    paths = [os.path.abspath(file_path) for file_path in figures]
+    if not paths:
+        return {}
+    common = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return {file_path: os.path.relpath(path, common) for file_path, path in zip(figures, paths)}
+
+def rgb(color, alpha=None):
+    channels = [int(round(255 * min(max(float(c), 0.0), 1.0))) for c in color[:3]]
+    if alpha is not None:
+        channels.append(int(round(255 * min(max(float(alpha), 0.0), 1.0))))
+    return tuple(channels)
+
+def screen_points(points, height, scale=1.0):
+    # Figure coordinates have their origin at the bottom-left corner, images at the top-left
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return np.column_stack([points[:, 0], height - points[:, 1]]) * scale
+
+def render_png(curves, file_path, size, supersample=1):
+    width, height = size
+    image = Image.new('RGB', (width * supersample, height * supersample), (0, 0, 0))
+    draw = ImageDraw.Draw(image, 'RGBA')
+    for curve in curves:
+        points = screen_points(curve.points, height, supersample)
+        if len(points) < 2:
+            continue
+        bg_color = curve.bg_color
+        if len(points) > 2 and bg_color[3] > 0:
+            draw.polygon(points.ravel().tolist(), fill=rgb(bg_color, bg_color[3]))
+        draw.line(points.ravel().tolist(), fill=rgb(curve.color), width=supersample)
+    if supersample > 1:
+        image = image.resize(size, Image.LANCZOS)
+    image.save(file_path)
+
+def svg_path(points, closed=False):
+    coordinates = ' '.join(f"{x:.2f},{y:.2f}" for x, y in points)
+    return f"M{coordinates}" + ('Z' if closed else '')
+
+def render_svg(curves, file_path, size):
+    width, height = size
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+             f'<rect width="{width}" height="{height}" fill="black"/>']
+    for curve in curves:
+        points = screen_points(curve.points, height)
+        if len(points) < 2:
+            continue
+        bg_color = curve.bg_color
+        if len(points) > 2 and bg_color[3] > 0:
+            red, green, blue = rgb(bg_color)
+            lines.append(f'<path d="{svg_path(points, closed=True)}" fill="rgb({red},{green},{blue})" '
+                         f'fill-opacity="{float(bg_color[3]):.3f}" stroke="none"/>')
+        red, green, blue = rgb(curve.color)
+        lines.append(f'<path d="{svg_path(points)}" fill="none" stroke="rgb({red},{green},{blue})" stroke-width="1"/>')
+    lines.append('</svg>')
+    with open(file_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+def render_figure(file_path, name, output_dir, formats, size, supersample):
+    # Runs in a worker process; returns the timings of one figure
+    result = {'file': file_path, 'outputs': []}
+    start = time.perf_counter()
+    try:
+        curves = read_figure(file_path)
+        loaded = time.perf_counter()
+        # Reading a figure also tessellates it (.spf files only store control points)
+        result['vertices'] = curves.vertex_count
+        result['curves'] = len(curves)
+        result['load_seconds'] = loaded - start
+
+        os.makedirs(os.path.dirname(os.path.join(output_dir, name)), exist_ok=True)
+        if 'png' in formats:
+            output = os.path.join(output_dir, name + '.png')
+            render_png(curves, output, size, supersample)
+            result['outputs'].append(output)
+        rasterized = time.perf_counter()
+        result['png_seconds'] = rasterized - loaded
+        if 'svg' in formats:
+            output = os.path.join(output_dir, name + '.svg')
+            render_svg(curves, output, size)
+            result['outputs'].append(output)
+        result['svg_seconds'] = time.perf_counter() - rasterized
+    except Exception as error:
+        result['error'] = f"{type(error).__name__}: {error}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def render_all(figures, output_dir, formats, size, supersample=1, jobs=None):
+    os.makedirs(output_dir, exist_ok=True)
+    names = output_names(figures)
+    if jobs == 1:
+        for file_path in figures:
+            yield render_figure(file_path, names[file_path], output_dir, formats, size, supersample)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(render_figure, file_path, names[file_path], output_dir, formats, size, supersample)
+                   for file_path in figures]
+        for future in as_completed(futures):
+            yield future.result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render saved figures to PNG and SVG without opening the editor.")
+    parser.add_argument('paths', nargs='+', help="figure files (.csv or .spf) or directories containing them")
+    parser.add_argument('--output-dir', default='rendered')
+    parser.add_argument('--format', nargs='+', choices=('png', 'svg'), default=['png', 'svg'], dest='formats')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="worker processes, 1 renders in this process")
+    parser.add_argument('--width', type=int, default=CANVAS_SIZE[0])
+    parser.add_argument('--height', type=int, default=CANVAS_SIZE[1])
+    parser.add_argument('--supersample', type=int, default=1, help="draw PNGs this many times larger and downscale")
+    parser.add_argument('--summary', help="where to write the JSON timing summary (default: OUTPUT_DIR/summary.json)")
+    args = parser.parse_args(argv)
+
+    figures = find_figures(args.paths)
+    if not figures:
+        parser.error("no figures found")
+
+    start = time.perf_counter()
+    results = []
+    for result in render_all(figures, args.output_dir, args.formats, (args.width, args.height),
+                             args.supersample, args.jobs):
+        results.append(result)
+        status = result['error'] if 'error' in result else f"{result['curves']} curves, {result['vertices']} vertices"
+        print(f"[{len(results)}/{len(figures)}] {result['file']}: {result['seconds'] * 1000:.1f} ms ({status})")
+    wall_seconds = time.perf_counter() - start
+    results.sort(key=lambda result: result['file'])
+
+    busy_seconds = sum(result['seconds'] for result in results)
+    summary = {
+        'meta': {'timestamp': time.time(), 'python': sys.version.split()[0], 'jobs': args.jobs,
+                 'formats': args.formats, 'size': [args.width, args.height], 'supersample': args.supersample},
+        'figures': len(results),
+        'failed': sum('error' in result for result in results),
+        'wall_seconds': wall_seconds,
+        'busy_seconds': busy_seconds,
+        'parallel_speedup': busy_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+        'results': results,
+    }
+    summary_path = args.summary or os.path.join(args.output_dir, 'summary.json')
+    with open(summary_path, 'w') as file:
+        json.dump(summary, file, indent=2)
+    print(f"Rendered {len(results) - summary['failed']}/{len(results)} figures in {wall_seconds:.2f} s "
+          f"({summary['parallel_speedup']:.1f}x parallel speedup), summary in {summary_path}")
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bspline import BSpline
+from curve_store import CurveStore
+from curves import bezier_curves_batch, points_bezier_curve, points_cubic_spline, tessellate
+from figure_io import read_figure_binary, read_figure_csv, write_figure_binary, write_figure_csv
+
+# Headless microbenchmarks for curve tessellation and figure I/O.
+# Usage: python bench.py [--quick] [--output results.json]
+# Every result is one JSON object, so runs can be stored and compared over time.
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def random_polygon(rng, n):
+    return rng.uniform(0, 1000, size=(n, 2))
+
+def random_figure(rng, count, degree):
+    curves = CurveStore()
+    for _ in range(count):
+        polygon = random_polygon(rng, degree + 1)
+        points = points_bezier_curve(polygon, t=1)
+        curves.append(points, rng.uniform(0, 1, 3), curve_type='Bézier', control_points=polygon)
+    return curves
+
+def bench_tessellation(rng, curve_count, repeat):
+    results = []
+    for degree in (1, 3, 5, 10, 20):
+        polygons = [random_polygon(rng, degree + 1) for _ in range(curve_count)]
+        seconds = best_time(lambda: [points_bezier_curve(p, t=1) for p in polygons], repeat)
+        results.append({'name': 'tessellate.bezier', 'degree': degree, 'samples': 101,
+                        'curves': curve_count, 'seconds': seconds, 'curves_per_second': curve_count / seconds})
+
+        stack = np.stack(polygons)
+        for samples in (101, 1001):
+            seconds = best_time(lambda: bezier_curves_batch(stack, samples), repeat)
+            results.append({'name': 'tessellate.bezier_batch', 'degree': degree, 'samples': samples,
+                            'curves': curve_count, 'seconds': seconds, 'curves_per_second': curve_count / seconds})
+
+        seconds = best_time(lambda: [points_cubic_spline(p, t=1) for p in polygons], repeat)
+        results.append({'name': 'tessellate.catmull_rom', 'degree': degree, 'samples': 101,
+                        'curves': curve_count, 'seconds': seconds, 'curves_per_second': curve_count / seconds})
+
+        for curve_mode in ('Bézier', 'B-spline'):
+            vertices = sum(len(tessellate(p, curve_mode, True, 0.25)[1]) for p in polygons)
+            seconds = best_time(lambda: [tessellate(p, curve_mode, True, 0.25) for p in polygons], repeat)
+            results.append({'name': 'tessellate.adaptive', 'mode': curve_mode, 'degree': degree,
+                            'tolerance': 0.25, 'curves': curve_count, 'seconds': seconds,
+                            'curves_per_second': curve_count / seconds,
+                            'vertices_per_curve': vertices / curve_count})
+
+    # Single Bézier curves of very high degree (log-space Bernstein basis) versus the same
+    # polygons drawn as chains of cubic pieces
+    for degree in (100, 1000):
+        polygons = [np.cumsum(rng.normal(size=(degree + 1, 2)), axis=0) for _ in range(max(curve_count // 50, 2))]
+        for curve_mode in ('Bézier', 'Piecewise cubic'):
+            vertices = sum(len(tessellate(p, curve_mode)[1]) for p in polygons)
+            seconds = best_time(lambda: [tessellate(p, curve_mode) for p in polygons], repeat)
+            results.append({'name': 'tessellate.high_degree', 'mode': curve_mode, 'degree': degree,
+                            'curves': len(polygons), 'seconds': seconds, 'curves_per_second': len(polygons) / seconds,
+                            'vertices_per_curve': vertices / len(polygons)})
+    return results
+
+def bench_bspline_edits(rng, point_counts, repeat):
+    # Building a long B-spline versus editing it locally
+    results = []
+    for count in point_counts:
+        polygon = random_polygon(rng, count)
+        seconds = best_time(lambda: BSpline(polygon, 3, 'clamped').tessellation(), repeat)
+        results.append({'name': 'bspline.build', 'points': count, 'seconds': seconds})
+
+        spline = BSpline(polygon, 3, 'clamped')
+        index = count // 2
+        seconds = best_time(lambda: spline.move_point(index, rng.uniform(0, 1000, 2)), repeat)
+        results.append({'name': 'bspline.move_point', 'points': count, 'seconds': seconds})
+
+        seconds = best_time(lambda: (spline.append_point(rng.uniform(0, 1000, 2)), spline.pop_point()), repeat)
+        results.append({'name': 'bspline.append_pop', 'points': count, 'seconds': seconds})
+    return results
+
+def bench_figure_io(rng, curve_counts, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for count in curve_counts:
+            curves = random_figure(rng, count, degree=3)
+            for kind, write, read in (('csv', write_figure_csv, read_figure_csv),
+                                      ('binary', write_figure_binary, read_figure_binary)):
+                path = os.path.join(directory, f'figure_{count}.{kind}')
+
+                seconds = best_time(lambda: write(path, curves), repeat)
+                results.append({'name': f'figure.save_{kind}', 'curves': count, 'seconds': seconds,
+                                'curves_per_second': count / seconds, 'file_bytes': os.path.getsize(path)})
+
+                seconds = best_time(lambda: read(path), repeat)
+                tracemalloc.start()
+                read(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append({'name': f'figure.load_{kind}', 'curves': count, 'seconds': seconds,
+                                'curves_per_second': count / seconds, 'peak_bytes': peak})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark curve tessellation and figure I/O.")
+    parser.add_argument('--quick', action='store_true', help="fewer curves and repeats, for smoke runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    repeat = 2 if args.quick else 5
+    curve_count = 50 if args.quick else 500
+    figure_sizes = (100,) if args.quick else (100, 1000, 5000)
+    spline_sizes = (100,) if args.quick else (100, 1000, 10000)
+
+    report = {
+        'meta': {'timestamp': time.time(), 'python': sys.version.split()[0], 'numpy': np.__version__,
+                 'platform': platform.platform(), 'seed': args.seed, 'quick': args.quick},
+        'results': (bench_tessellation(rng, curve_count, repeat) + bench_bspline_edits(rng, spline_sizes, repeat)
+                    + bench_figure_io(rng, figure_sizes, repeat)),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
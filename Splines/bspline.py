@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+
+from curves import CURVE_SAMPLES, adaptive_tessellation
+
+# B-spline / NURBS curves with knot vectors, any degree and optional rational weights.
+#
+# Knot vector types:
+#   clamped  end knots repeated degree + 1 times, the curve starts and ends on the end points
+#   open     uniformly spaced knots, the curve floats inside the control polygon
+#   uniform  closed (periodic) curve with uniform knots, the polygon wraps around
+#
+# The curve is tessellated span by span (one span per non-empty knot interval). Moving a
+# control point only changes the degree + 1 spans in its local support, so move_point()
+# re-evaluates those and keeps every other span from the cache. Knots are spaced one unit
+# apart (the parameter is normalized to [0, 1] only on output), so appending or removing the
+# last control point leaves the knots of all earlier spans unchanged and only the tail of the
+# curve is re-evaluated.
+
+KNOT_TYPES = ('clamped', 'open', 'uniform')
+
+def knot_vector(count, degree, knot_type):
+    # Knots for count (already wrapped, for 'uniform') control points
+    if knot_type == 'clamped':
+        interior = np.arange(1.0, count - degree)
+        return np.concatenate([np.zeros(degree + 1), interior, np.full(degree + 1, float(count - degree))])
+    return np.arange(float(count + degree + 1))
+
+def basis_functions(span, u, degree, knots):
+    # Non-zero basis functions N[span - degree .. span] at every u of the span, shape (len(u), degree + 1)
+    # (Cox-de Boor recurrence, vectorized over u)
+    u = np.asarray(u, dtype=float)
+    basis = np.zeros((len(u), degree + 1))
+    basis[:, 0] = 1.0
+    left = np.zeros((len(u), degree + 1))
+    right = np.zeros((len(u), degree + 1))
+    for j in range(1, degree + 1):
+        left[:, j] = u - knots[span + 1 - j]
+        right[:, j] = knots[span + j] - u
+        saved = np.zeros(len(u))
+        for r in range(j):
+            denominator = right[:, r + 1] + left[:, j - r]
+            temp = np.divide(basis[:, r], denominator, out=np.zeros(len(u)), where=denominator != 0)
+            basis[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        basis[:, j] = saved
+    return basis
+
+class BSpline:
+    def __init__(self, control_points, degree=3, knot_type='clamped', weights=None, tolerance=None):
+        if knot_type not in KNOT_TYPES:
+            raise ValueError(f"Unknown knot vector type: {knot_type}")
+        self.control_points = np.array(control_points, dtype=float).reshape(-1, 2)
+        self.weights = None if weights is None else np.array(weights, dtype=float)
+        self.knot_type = knot_type
+        self.tolerance = tolerance  # None samples every span uniformly
+        self.requested_degree = degree
+        self.segments = {}
+        self._prepare()
+        self.segments = {span: self._tessellate_span(span) for span in self.spans}
+
+    def _prepare(self):
+        count = len(self.control_points)
+        self.degree = max(1, min(self.requested_degree, count - 1))
+        # A closed curve repeats its first degree points after the last one
+        self.wrap = self.degree if self.knot_type == 'uniform' else 0
+        self.knots = knot_vector(count + self.wrap, self.degree, self.knot_type)
+        self.domain = (self.knots[self.degree], self.knots[count + self.wrap])
+        self.spans = [i for i in range(self.degree, count + self.wrap) if self.knots[i] < self.knots[i + 1]]
+        # Short curves get more samples per span, so every curve has at least CURVE_SAMPLES points
+        self.samples_per_span = max(8, math.ceil((CURVE_SAMPLES - 1) / max(len(self.spans), 1)))
+
+    def _resized(self, first_changed_point):
+        # Re-evaluate the spans affected by adding or removing control points from
+        # first_changed_point on; spans before it whose knots did not change are kept
+        old = (self.knots, self.degree, self.samples_per_span)
+        self._prepare()
+        if (self.degree, self.samples_per_span) != old[1:]:
+            self.segments = {span: self._tessellate_span(span) for span in self.spans}
+            return
+        overlap = min(len(old[0]), len(self.knots))
+        differs = np.flatnonzero(old[0][:overlap] != self.knots[:overlap])
+        first_changed_knot = differs[0] if len(differs) else overlap
+        keep_below = min(first_changed_knot - self.degree, first_changed_point)
+        self.segments = {span: self.segments[span] if span < keep_below and span in self.segments
+                         else self._tessellate_span(span) for span in self.spans}
+
+    def append_point(self, point, weight=None):
+        count = len(self.control_points)
+        self.control_points = np.vstack([self.control_points, np.reshape(point, (1, 2))])
+        if self.weights is not None or weight is not None:
+            previous = np.ones(count) if self.weights is None else self.weights
+            self.weights = np.append(previous, 1.0 if weight is None else weight)
+        self._resized(count)
+
+    def pop_point(self):
+        self.control_points = self.control_points[:-1]
+        if self.weights is not None:
+            self.weights = self.weights[:-1]
+        self._resized(len(self.control_points))
+
+    def _homogeneous(self, first, last):
+        # Weighted control points (x * w, y * w, w) for wrapped indices first..last
+        indices = np.arange(first, last + 1) % len(self.control_points)
+        points = self.control_points[indices]
+        if self.weights is None:
+            return np.hstack([points, np.ones((len(points), 1))])
+        weights = self.weights[indices][:, None]
+        return np.hstack([points * weights, weights])
+
+    def _evaluate_span(self, span, u):
+        basis = basis_functions(span, u, self.degree, self.knots)
+        homogeneous = basis @ self._homogeneous(span - self.degree, span)
+        return homogeneous[:, :2] / homogeneous[:, 2:]
+
+    def _tessellate_span(self, span):
+        start, end = self.knots[span], self.knots[span + 1]
+        if self.tolerance is None:
+            local = np.linspace(0.0, 1.0, self.samples_per_span + 1)
+            points = self._evaluate_span(span, start + (end - start) * local)
+        else:
+            local, points = adaptive_tessellation(lambda s: self._evaluate_span(span, start + (end - start) * s),
+                                                  self.tolerance)
+        return start + (end - start) * local, points
+
+    def evaluate(self, ts):
+        # Points at global parameters ts in [0, 1]
+        ts = np.asarray(ts, dtype=float)
+        u = self.domain[0] + (self.domain[1] - self.domain[0]) * ts
+        spans = np.searchsorted(self.knots, u, side='right') - 1
+        # u == domain end falls past the last span (and repeated knots give empty spans),
+        # so snap every u to the last non-empty span starting at or before it
+        real_spans = np.array(self.spans)
+        spans = real_spans[np.clip(np.searchsorted(real_spans, spans, side='right') - 1, 0, len(real_spans) - 1)]
+        points = np.zeros((len(u), 2))
+        for span in np.unique(spans):
+            mask = spans == span
+            points[mask] = self._evaluate_span(span, u[mask])
+        return points
+
+    def affected_spans(self, index):
+        # Spans whose shape depends on control point index (including its wrapped copy)
+        count = len(self.control_points)
+        spans = set()
+        for position in (index, index + count) if self.wrap else (index,):
+            spans.update(range(position, position + self.degree + 1))
+        return [span for span in self.spans if span in spans]
+
+    def move_point(self, index, point, weight=None):
+        self.control_points[index] = point
+        if weight is not None:
+            if self.weights is None:
+                self.weights = np.ones(len(self.control_points))
+            self.weights[index] = weight
+        for span in self.affected_spans(index):
+            self.segments[span] = self._tessellate_span(span)
+
+    def tessellation(self):
+        # Parameter values (mapped to [0, 1]) and points of the whole curve; spans share end points
+        if not self.spans:
+            return np.zeros(0), np.zeros((0, 2))
+        parameters, points = [], []
+        for i, span in enumerate(self.spans):
+            span_parameters, span_points = self.segments[span]
+            skip = 0 if i == 0 else 1
+            parameters.append(span_parameters[skip:])
+            points.append(span_points[skip:])
+        parameters = np.concatenate(parameters)
+        length = self.domain[1] - self.domain[0]
+        return (parameters - self.domain[0]) / length, np.concatenate(points)
@@ -0,0 +1,277 @@
+import numpy as np
+
+from bspline import KNOT_TYPES
+from curves import tessellate
+
+# Finalized curves of a figure, stored in a few contiguous arrays.
+# The samples of all curves lie back to back in one float32 vertex array and the control
+# polygons in one float64 array; type, colors, tolerance, B-spline settings and bounding box
+# are one row per curve. Drawing, saving and loading work on slices of these arrays instead
+# of thousands of small per-curve objects. Curves are only appended and removed at the end,
+# which is how the editor finalizes and undoes them.
+#
+# store[i] is a Curve, a small handle reading the rows of curve i. A curve popped from the
+# store moves into a one-curve store of its own, so the handle stays valid (e.g. while it is
+# kept by the undo history) and can be appended to a store again.
+#
+# Curves of an opened figure can be lazy: their samples are not stored but computed from the
+# control points the first time curve.points is read (usually when the curve is first drawn)
+# and kept in the handle's cache. Their bounding box is that of the control polygon, which
+# contains the curve for the types where that holds (see figure_io.LAZY_CURVE_TYPES).
+
+CURVE_TYPES = ('Bézier', 'Catmull-Rom', 'Polyline', 'B-spline', 'Piecewise cubic')
+
+# Arrays with one row per curve
+CURVE_ROWS = {
+    'types': ((), np.uint8),
+    'colors': ((3,), np.float32),
+    'bg_colors': ((4,), np.float32),
+    'tolerances': ((), np.float64),  # NaN for uniformly sampled curves
+    'degrees': ((), np.uint8),
+    'knot_types': ((), np.uint8),
+    'bboxes': ((4,), np.float32),  # left, bottom, right, top of the samples
+    'lazy': ((), np.bool_),  # Samples not stored, computed from the control points when first read
+}
+
+class Curve:
+    __slots__ = ('store', 'index', 'cache')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.cache = None  # Data derived from the curve (samples of a lazy curve, at a level of detail)
+
+    @property
+    def points(self):
+        if self.store.lazy[self.index]:
+            return self.cached('points', self._tessellate)
+        offsets = self.store.offsets
+        return self.store.vertices[offsets[self.index]:offsets[self.index + 1]]
+
+    def _tessellate(self):
+        tolerance = self.tolerance
+        points = tessellate(self.control_points, self.type, tolerance is not None, tolerance, self.degree,
+                            self.knot_type, self.weights)[1]
+        return np.asarray(points, dtype=np.float32).reshape(-1, 2)
+
+    @property
+    def lazy(self):
+        # Samples not computed yet
+        return bool(self.store.lazy[self.index]) and 'points' not in (self.cache or {})
+
+    @property
+    def control_points(self):
+        # None for curves known only by their samples (e.g. loaded from a CSV figure)
+        offsets = self.store.control_offsets
+        first, last = offsets[self.index], offsets[self.index + 1]
+        return self.store.control_points[first:last] if last > first else None
+
+    @property
+    def weights(self):
+        offsets = self.store.control_offsets
+        weights = self.store.weights[offsets[self.index]:offsets[self.index + 1]]
+        return None if np.all(weights == 1.0) else weights
+
+    @property
+    def type(self):
+        return CURVE_TYPES[self.store.types[self.index]]
+
+    @property
+    def color(self):
+        return self.store.colors[self.index]
+
+    @property
+    def bg_color(self):
+        return self.store.bg_colors[self.index]
+
+    @property
+    def tolerance(self):
+        tolerance = self.store.tolerances[self.index]
+        return None if np.isnan(tolerance) else float(tolerance)
+
+    @property
+    def degree(self):
+        return int(self.store.degrees[self.index])
+
+    @property
+    def knot_type(self):
+        return KNOT_TYPES[self.store.knot_types[self.index]]
+
+    @property
+    def bbox(self):
+        return self.store.bboxes[self.index]
+
+    def cached(self, key, compute):
+        if self.cache is None:
+            self.cache = {}
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    @property
+    def nbytes(self):
+        # Approximate memory used by this curve, including its cached data (and so the samples of
+        # a lazy curve once they were computed)
+        stored = self.store.offsets[self.index + 1] - self.store.offsets[self.index]
+        size = 8 * stored + 24 * (self.store.control_offsets[self.index + 1] - self.store.control_offsets[self.index])
+        for value in (self.cache or {}).values():
+            if isinstance(value, np.ndarray):
+                size += value.nbytes
+            elif isinstance(value, tuple):  # Level and samples at that level of detail
+                size += value[1].nbytes
+        return size + 64
+
+def _ranges(offsets, order):
+    # Rows of the ranges offsets[i]..offsets[i + 1] - 1 for i in order, back to back, and the
+    # offsets of the ranges in that order
+    sizes = offsets[order + 1] - offsets[order]
+    ordered = np.concatenate(([0], np.cumsum(sizes)))
+    return np.repeat(offsets[order] - ordered[:-1], sizes) + np.arange(ordered[-1]), ordered
+
+class CurveStore:
+    def __init__(self, vertex_capacity=1024, curve_capacity=16, control_capacity=None):
+        control_capacity = curve_capacity * 4 if control_capacity is None else control_capacity
+        self.vertices = np.zeros((vertex_capacity, 2), dtype=np.float32)
+        self.control_points = np.zeros((control_capacity, 2))
+        self.weights = np.ones(control_capacity)
+        self.offsets = np.zeros(curve_capacity + 1, dtype=np.int64)  # Sample range of every curve
+        self.control_offsets = np.zeros(curve_capacity + 1, dtype=np.int64)  # Control point range
+        for name, (shape, dtype) in CURVE_ROWS.items():
+            setattr(self, name, np.zeros((curve_capacity,) + shape, dtype=dtype))
+        self.handles = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.handles[index]
+
+    def __iter__(self):
+        return iter(self.handles)
+
+    @property
+    def vertex_count(self):
+        return int(self.offsets[self.count])
+
+    @property
+    def control_count(self):
+        return int(self.control_offsets[self.count])
+
+    @property
+    def nbytes(self):
+        return sum(curve.nbytes for curve in self.handles)
+
+    def _reserve(self, vertices, controls, curves):
+        # Room for that many more samples, control points and curves
+        vertex_total = self.vertex_count + vertices
+        if vertex_total > len(self.vertices):
+            self.vertices = np.resize(self.vertices, (max(vertex_total, 2 * len(self.vertices)), 2))
+        control_total = self.control_count + controls
+        if control_total > len(self.control_points):
+            capacity = max(control_total, 2 * len(self.control_points))
+            self.control_points = np.resize(self.control_points, (capacity, 2))
+            self.weights = np.resize(self.weights, capacity)
+        curve_total = self.count + curves
+        if curve_total > len(self.types):
+            capacity = max(curve_total, 2 * len(self.types))
+            self.offsets = np.resize(self.offsets, capacity + 1)
+            self.control_offsets = np.resize(self.control_offsets, capacity + 1)
+            for name in CURVE_ROWS:
+                array = getattr(self, name)
+                setattr(self, name, np.resize(array, (capacity,) + array.shape[1:]))
+
+    def append(self, points, color, bg_color=(0.0, 0.0, 0.0, 0.0), curve_type='Polyline', control_points=None,
+               tolerance=None, degree=3, knot_type='clamped', weights=None, lazy=False):
+        # A lazy curve is given no points, they are computed from control_points when first read
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        control_points = np.zeros((0, 2)) if control_points is None else np.asarray(control_points, dtype=float).reshape(-1, 2)
+        self._reserve(len(points), len(control_points), 1)
+        index = self.count
+        vertex, control = self.offsets[index], self.control_offsets[index]
+        self.vertices[vertex:vertex + len(points)] = points
+        self.offsets[index + 1] = vertex + len(points)
+        self.control_points[control:control + len(control_points)] = control_points
+        self.weights[control:control + len(control_points)] = 1.0 if weights is None else weights
+        self.control_offsets[index + 1] = control + len(control_points)
+        self.types[index] = CURVE_TYPES.index(curve_type if curve_type in CURVE_TYPES else 'Polyline')
+        self.colors[index] = color[:3]
+        self.bg_colors[index] = bg_color
+        self.tolerances[index] = np.nan if tolerance is None else tolerance
+        self.degrees[index] = degree
+        self.knot_types[index] = KNOT_TYPES.index(knot_type)
+        self.lazy[index] = lazy
+        bounded = control_points if lazy else points
+        self.bboxes[index] = (*bounded.min(axis=0), *bounded.max(axis=0)) if len(bounded) else (np.inf, np.inf, -np.inf, -np.inf)
+        self.count += 1
+        self.handles.append(Curve(self, index))
+        return self.handles[-1]
+
+    def _take(self, source, first, last):
+        # Copies curves first..last - 1 of source to the end of this store and moves their handles here
+        vertex_first, vertex_last = source.offsets[first], source.offsets[last]
+        control_first, control_last = source.control_offsets[first], source.control_offsets[last]
+        self._reserve(vertex_last - vertex_first, control_last - control_first, last - first)
+        index, vertex, control = self.count, self.vertex_count, self.control_count
+        curves = last - first
+        self.vertices[vertex:vertex + vertex_last - vertex_first] = source.vertices[vertex_first:vertex_last]
+        self.offsets[index + 1:index + curves + 1] = source.offsets[first + 1:last + 1] - vertex_first + vertex
+        self.control_points[control:control + control_last - control_first] = source.control_points[control_first:control_last]
+        self.weights[control:control + control_last - control_first] = source.weights[control_first:control_last]
+        self.control_offsets[index + 1:index + curves + 1] = source.control_offsets[first + 1:last + 1] - control_first + control
+        for name in CURVE_ROWS:
+            getattr(self, name)[index:index + curves] = getattr(source, name)[first:last]
+        handles = source.handles[first:last]
+        for handle in handles:
+            handle.store = self
+            handle.index += index - first
+        self.handles.extend(handles)
+        self.count += curves
+
+    def attach(self, curve):
+        # Appends a curve that is the last one of another store (usually a popped or standalone one)
+        source, index = curve.store, curve.index
+        self._take(source, index, index + 1)
+        source.handles.pop()
+        source.count -= 1
+        return curve
+
+    def extend(self, other):
+        # Appends every curve of other (e.g. a batch read from a file); other is left empty
+        first = self.count
+        self._take(other, 0, other.count)
+        other.handles = []
+        other.count = 0
+        return range(first, self.count)
+
+    def reorder(self, order):
+        # Moves curve order[k] to position k for every k; the handles (and the data cached with
+        # them) move along with their curves
+        order = np.asarray(order, dtype=np.int64)
+        count = self.count
+        rows, self.offsets[:count + 1] = _ranges(self.offsets[:count + 1], order)
+        self.vertices[:len(rows)] = self.vertices[rows]
+        rows, self.control_offsets[:count + 1] = _ranges(self.control_offsets[:count + 1], order)
+        self.control_points[:len(rows)] = self.control_points[rows]
+        self.weights[:len(rows)] = self.weights[rows]
+        for name in CURVE_ROWS:
+            array = getattr(self, name)
+            array[:count] = array[order]
+        self.handles = [self.handles[i] for i in order.tolist()]
+        for index, handle in enumerate(self.handles):
+            handle.index = index
+
+    def pop(self):
+        # Removes the last curve and returns its handle, which now owns a copy of its data
+        curve = self.handles[-1]
+        samples = self.offsets[self.count] - self.offsets[self.count - 1]
+        controls = self.control_offsets[self.count] - self.control_offsets[self.count - 1]
+        CurveStore(max(samples, 1), 1, max(controls, 1)).attach(curve)
+        return curve
+
+def make_curve(points, color, bg_color=(0.0, 0.0, 0.0, 0.0), curve_type='Polyline', control_points=None,
+               tolerance=None, degree=3, knot_type='clamped', weights=None):
+    # A curve in a store of its own, to be attached to the figure's store
+    control_count = 1 if control_points is None else len(control_points)
+    store = CurveStore(max(len(points), 1), 1, max(control_count, 1))
+    return store.append(points, color, bg_color, curve_type, control_points, tolerance, degree, knot_type, weights)
@@ -0,0 +1,238 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Curve math shared by the editor, the benchmarks and any other tool.
+# Nothing in this module touches pygame, OpenGL or Tkinter, so it can be imported headless.
+
+# Parameter values sampled for every curve: 0.00, 0.01, ..., 1.00
+CURVE_SAMPLES = 101
+curve_parameters = np.arange(CURVE_SAMPLES) / (CURVE_SAMPLES - 1.0)
+
+# Above this degree the binomial coefficients overflow and the powers of t underflow (both long
+# before degree 1000), so the Bernstein polynomials are evaluated in log space instead
+STABLE_BERNSTEIN_DEGREE = 30
+BERNSTEIN_CHUNK = 256  # Parameters evaluated together by high-degree Bézier curves
+
+def bernstein_matrix(degree, ts):
+    ts = np.asarray(ts, dtype=float)[:, None]
+    i = np.arange(degree + 1)
+    if degree > STABLE_BERNSTEIN_DEGREE:
+        return log_bernstein_matrix(degree, ts)
+    coefficients = np.array([math.comb(degree, k) for k in i], dtype=float)
+    return coefficients * ts**i * (1 - ts)**(degree - i)
+
+@lru_cache(maxsize=64)
+def log_binomials(degree):
+    # log C(degree, i) for every i, without overflow
+    i = np.arange(1, degree + 1)
+    logs = np.concatenate([[0.0], np.cumsum(np.log((degree - i + 1) / i))])
+    logs.setflags(write=False)
+    return logs
+
+def log_bernstein_matrix(degree, ts, first=0, last=None):
+    # exp(log C(n, i) + i log t + (n - i) log(1 - t)) for i in first..last - 1; every term stays
+    # in range for any degree
+    ts = np.asarray(ts, dtype=float).reshape(-1, 1)
+    last = degree + 1 if last is None else last
+    i = np.arange(first, last)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_t, log_rest = np.log(ts), np.log1p(-ts)
+        # 0 * log(0) is 0 here (t**0 == 1), not NaN
+        terms = (log_binomials(degree)[first:last] + np.where(i > 0, i * log_t, 0.0)
+                 + np.where(i < degree, (degree - i) * log_rest, 0.0))
+    return np.exp(terms)
+
+def bernstein_range(degree, ts):
+    # Range of the Bernstein polynomials that matter at ts. B(i, n)(t) is the probability of i
+    # in a binomial distribution, which by Bernstein's inequality has less than 1e-25 of its
+    # mass beyond 12 standard deviations + 40 from its mean n t
+    reach = 12 * np.sqrt(degree * ts * (1 - ts)) + 40
+    first = int(np.floor(np.min(degree * ts - reach)))
+    last = int(np.ceil(np.max(degree * ts + reach))) + 1
+    return max(first, 0), min(last, degree + 1)
+
+@lru_cache(maxsize=64)
+def bernstein_basis(degree, samples):
+    # Basis matrix of shape (samples, degree + 1), shared by every curve of this degree
+    basis = bernstein_matrix(degree, np.linspace(0.0, 1.0, samples))
+    basis.setflags(write=False)
+    return basis
+
+def bezier_curve_batch(points, ts):
+    points = np.asarray(points, dtype=float)
+    degree = len(points) - 1
+    if degree <= STABLE_BERNSTEIN_DEGREE:
+        return bernstein_matrix(degree, ts) @ points
+    # At high degree each sample depends on the control points near degree * t only, so runs of
+    # nearby parameters (like the sorted ones of adaptive_tessellation) sum a slice of them
+    ts = np.asarray(ts, dtype=float)
+    samples = np.empty((len(ts), points.shape[1]))
+    for start in range(0, len(ts), BERNSTEIN_CHUNK):
+        chunk = ts[start:start + BERNSTEIN_CHUNK]
+        first, last = bernstein_range(degree, chunk)
+        samples[start:start + len(chunk)] = log_bernstein_matrix(degree, chunk, first, last) @ points[first:last]
+    return samples
+
+def bezier_curves_batch(control_polygons, samples=CURVE_SAMPLES):
+    # control_polygons has shape (curves, degree + 1, 2), result has shape (curves, samples, 2)
+    control_polygons = np.asarray(control_polygons, dtype=float)
+    basis = bernstein_basis(control_polygons.shape[1] - 1, samples)
+    return basis @ control_polygons
+
+def bezier_curve(points, t):
+    return bezier_curve_batch(points, [t])[0]
+
+def samples_up_to(t):
+    return int(np.count_nonzero(curve_parameters <= t))
+
+def points_bezier_curve(points, t):
+    points = np.asarray(points, dtype=float)
+    basis = bernstein_basis(len(points) - 1, CURVE_SAMPLES)
+    return basis[:samples_up_to(t)] @ points
+
+def cubic_spline_interpolation(points, t):
+    points = np.array(points)
+    n = len(points)
+    k = int(t * (n - 1))
+    t_i = t * (n - 1) - k
+    p0 = points[k]
+    p1 = points[(k + 1) % n]
+    p2 = points[(k + 2) % n]
+    p3 = points[(k + 3) % n]
+    
+    a = -0.5 * p0 + 1.5 * p1 - 1.5 * p2 + 0.5 * p3
+    b = p0 - 2.5 * p1 + 2 * p2 - 0.5 * p3
+    c = -0.5 * p0 + 0.5 * p2
+    d = p1
+    
+    return a * (t_i**3) + b * (t_i**2) + c * t_i + d
+
+def cubic_spline_batch(points, ts):
+    # Same segments as cubic_spline_interpolation, evaluated for a whole vector of parameters
+    points = np.asarray(points, dtype=float)
+    ts = np.asarray(ts, dtype=float)
+    n = len(points)
+    k = (ts * (n - 1)).astype(int)
+    t_i = (ts * (n - 1) - k)[:, None]
+    p0 = points[k]
+    p1 = points[(k + 1) % n]
+    p2 = points[(k + 2) % n]
+    p3 = points[(k + 3) % n]
+
+    a = -0.5 * p0 + 1.5 * p1 - 1.5 * p2 + 0.5 * p3
+    b = p0 - 2.5 * p1 + 2 * p2 - 0.5 * p3
+    c = -0.5 * p0 + 0.5 * p2
+    d = p1
+
+    return ((a * t_i + b) * t_i + c) * t_i + d
+
+def points_cubic_spline(points, t):
+    return cubic_spline_batch(points, curve_parameters[:samples_up_to(t)])
+
+# Long control polygons can be drawn as a chain of cubic Bézier pieces instead of one curve of
+# very high degree: the uniform cubic B-spline of the polygon, with the end points repeated so
+# it starts and ends on them, converted span by span to Bézier form. Each sample then depends
+# on four control points however long the polygon is.
+
+def piecewise_cubic_segments(points):
+    # Cubic Bézier control points of every piece, shape (pieces, 4, 2)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    padded = np.concatenate([points[:1], points[:1], points, points[-1:], points[-1:]])
+    a, b, c, d = padded[:-3], padded[1:-2], padded[2:-1], padded[3:]
+    return np.stack([(a + 4 * b + c) / 6, (2 * b + c) / 3, (b + 2 * c) / 3, (b + 4 * c + d) / 6], axis=1)
+
+def piecewise_cubic_batch(segments, ts):
+    # Points at global parameters ts in [0, 1], the pieces sharing the parameter range equally
+    ts = np.asarray(ts, dtype=float)
+    count = len(segments)
+    piece = np.minimum((ts * count).astype(int), count - 1)
+    local = ts * count - piece
+    basis = bernstein_matrix(3, local)
+    return np.einsum('sk,skd->sd', basis, segments[piece])
+
+def piecewise_cubic_parameters(count):
+    # Uniform parameters with at least CURVE_SAMPLES in total and 4 samples per piece
+    per_piece = max(4, math.ceil((CURVE_SAMPLES - 1) / count))
+    return np.linspace(0.0, 1.0, count * per_piece + 1)
+
+def chord_distance(points, starts, ends):
+    # Distance of each point from the segment between the matching start and end points
+    chord = ends - starts
+    offset = points - starts
+    length = np.hypot(chord[:, 0], chord[:, 1])
+    cross = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0])
+    return np.where(length > 0, cross / np.maximum(length, 1e-12), np.hypot(offset[:, 0], offset[:, 1]))
+
+def adaptive_tessellation(evaluate, tolerance, initial_segments=1, max_depth=16):
+    # Split parameter intervals until the curve at 1/4, 1/2 and 3/4 of every interval lies
+    # within tolerance pixels of its chord. Each pass evaluates all unsettled intervals in one batch.
+    ts = np.linspace(0.0, 1.0, initial_segments + 1)
+    points = evaluate(ts)
+    active = np.arange(initial_segments)
+    for _ in range(max_depth):
+        starts, ends = ts[active], ts[active + 1]
+        probes = evaluate(np.concatenate([(3 * starts + ends) / 4, (starts + ends) / 2, (starts + 3 * ends) / 4]))
+        probes = probes.reshape(3, len(active), 2)
+        deviation = np.max([chord_distance(probe, points[active], points[active + 1]) for probe in probes], axis=0)
+        split = deviation > tolerance
+        if not split.any():
+            break
+        middles, middle_points = ((starts + ends) / 2)[split], probes[1][split]
+        active = active[split]
+        ts = np.insert(ts, active + 1, middles)
+        points = np.insert(points, active + 1, middle_points, axis=0)
+        # Both halves of every split interval are tested again on the next pass
+        shifted = active + np.arange(len(active))
+        active = np.sort(np.concatenate([shifted, shifted + 1]))
+    return ts, points
+
+def tessellate(points, curve_mode, adaptive=False, tolerance=None, degree=3, knot_type='clamped', weights=None):
+    # Returns the parameter values and the sampled points of a full curve
+    if curve_mode == 'Bézier':
+        evaluate = lambda ts: bezier_curve_batch(points, ts)
+        uniform = lambda: points_bezier_curve(points, t=1)
+    elif curve_mode == 'B-spline':
+        from bspline import BSpline  # bspline builds on this module
+        return BSpline(points, degree, knot_type, weights, tolerance if adaptive else None).tessellation()
+    elif curve_mode == 'Catmull-Rom':
+        # The evaluator behind the B-spline mode before it had a real B-spline engine
+        evaluate = lambda ts: cubic_spline_batch(points, ts)
+        uniform = lambda: points_cubic_spline(points, t=1)
+    elif curve_mode == 'Piecewise cubic':
+        segments = piecewise_cubic_segments(points)
+        if adaptive:
+            return adaptive_tessellation(lambda ts: piecewise_cubic_batch(segments, ts), tolerance,
+                                         initial_segments=len(segments))
+        parameters = piecewise_cubic_parameters(len(segments))
+        return parameters, piecewise_cubic_batch(segments, parameters)
+    elif curve_mode == 'Polyline':
+        # Already sampled curves (e.g. converted from CSV figures) are drawn as they are
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return np.linspace(0.0, 1.0, len(points)), points
+    else:
+        return np.zeros(0), np.zeros((0, 2))
+    if adaptive:
+        # Start from one interval per control polygon leg so no span of the curve is skipped
+        return adaptive_tessellation(evaluate, tolerance, initial_segments=max(1, len(points) - 1))
+    return curve_parameters, uniform()
+
+def arc_length_table(points):
+    # Cumulative polyline length at every sample, starting at 0
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    segments = np.hypot(*np.diff(points, axis=0).T)
+    return np.concatenate([[0.0], np.cumsum(segments)])
+
+def prefix_by_length(points, lengths, fraction):
+    # The part of a sampled curve covering the given fraction of its length, ending exactly at
+    # that length. Finding the cut is a binary search in the arc-length table.
+    total = lengths[-1] if len(lengths) else 0.0
+    if fraction >= 1.0 or total == 0.0:
+        return points if fraction >= 1.0 else points[:0]
+    target = max(fraction, 0.0) * total
+    i = int(np.searchsorted(lengths, target, side='right'))
+    start, end = points[i - 1], points[i]
+    step = lengths[i] - lengths[i - 1]
+    cut = start + (end - start) * ((target - lengths[i - 1]) / step if step > 0 else 0.0)
+    return np.concatenate([points[:i], cut[None]])
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from bspline import KNOT_TYPES
+from curve_store import CURVE_TYPES, CurveStore
+from curves import CURVE_SAMPLES, bezier_curves_batch, tessellate
+
+# Reading and writing point files and figures, independent of the editor window.
+# Figures are read into and written from a curve_store.CurveStore.
+# pandas takes about half a second to import, so only the CSV functions import it, when used.
+
+# Curves that lie within the bounding box of their control polygon (convex hull property),
+# which can stand in for theirs until they are tessellated. Catmull-Rom curves overshoot it.
+LAZY_CURVE_TYPES = ('Bézier', 'B-spline', 'Piecewise cubic', 'Polyline')
+
+def write_points(file_path, points):
+    with open(file_path, 'w') as file:
+        for point in points:
+            file.write(f"{point[0]},{point[1]}\n")
+
+def read_points(file_path):
+    if os.path.getsize(file_path) == 0:
+        return []
+    import pandas as pd
+    return pd.read_csv(file_path, header=None, names=['x', 'y'], dtype=np.float64).to_numpy().tolist()
+
+def write_figure_csv(file_path, curves):
+    data = []
+    for curve in curves:
+        points = ','.join([f"{x} {y}" for x, y in curve.points.tolist()])
+        color = ' '.join(map(str, curve.color.tolist()))
+        bg_color = ' '.join(map(str, curve.bg_color.tolist()))
+        data.append([curve.type, points, color, bg_color, curve.tolerance])
+    import pandas as pd
+    df = pd.DataFrame(data, columns=['type', 'points', 'color', 'bg_color', 'tolerance'])
+    df.to_csv(file_path, index=False)
+
+def parse_point_list(text):
+    # "x0 y0,x1 y1,..." -> array of shape (n, 2), converted by NumPy in one call
+    values = np.array(text.replace(',', ' ').split(), dtype=np.float64)
+    return values[:len(values) // 2 * 2].reshape(-1, 2)
+
+def figure_rows_to_curves(df):
+    import pandas as pd
+    curves = CurveStore(curve_capacity=max(len(df), 1))
+    # Figures saved before adaptive tessellation have no tolerance column
+    tolerances = df['tolerance'] if 'tolerance' in df else [None] * len(df)
+    for curve_type, points, color, bg_color, tolerance in zip(df['type'], df['points'], df['color'], df['bg_color'], tolerances):
+        # CSV figures only keep the samples, curves without a known type are drawn as polylines
+        curves.append(parse_point_list(points), list(map(float, color.split())), list(map(float, bg_color.split())),
+                      'Polyline' if pd.isna(curve_type) else curve_type,
+                      tolerance=None if pd.isna(tolerance) else float(tolerance))
+    return curves
+
+def read_figure_csv(file_path):
+    import pandas as pd
+    return figure_rows_to_curves(pd.read_csv(file_path))
+
+# Streaming readers: generators yielding (batch, fraction of the file read) so large files can
+# be parsed in chunks, e.g. by loader.BackgroundLoader, and stopped between chunks.
+
+def iter_points(file_path, chunk_rows=50000):
+    import pandas as pd
+    size = max(os.path.getsize(file_path), 1)
+    with open(file_path, 'rb') as file:
+        for chunk in pd.read_csv(file, header=None, names=['x', 'y'], dtype=np.float64, chunksize=chunk_rows):
+            yield chunk.to_numpy(), min(file.tell() / size, 1.0)
+
+def iter_figure_csv(file_path, chunk_rows=500):
+    import pandas as pd
+    size = max(os.path.getsize(file_path), 1)
+    with open(file_path, 'rb') as file:
+        for chunk in pd.read_csv(file, chunksize=chunk_rows):
+            yield figure_rows_to_curves(chunk), min(file.tell() / size, 1.0)
+
+# Binary figure format (.spf)
+#
+#   magic (8 bytes) | header length (uint64, little endian) | JSON header | arrays
+#
+# The header lists every array with its dtype, shape and byte offset. Arrays start on
+# 64-byte boundaries so they can be memory-mapped directly:
+#   types           uint8   (curves,)        index into CURVE_TYPES
+#   offsets         int64   (curves + 1,)    control point range of every curve
+#   control_points  float64 (points, 2)
+#   colors          float32 (curves, 3)
+#   bg_colors       float32 (curves, 4)
+#   tolerances      float64 (curves,)        NaN for uniformly sampled curves
+#   degrees         uint8   (curves,)        B-spline degree
+#   knot_types      uint8   (curves,)        index into KNOT_TYPES
+#   weights         float64 (points,)        rational weight per point
+#
+# Type 4 ('Piecewise cubic') is a long Bézier polygon drawn as a chain of cubic pieces.
+# Curves saved without control points (e.g. loaded from a CSV figure) are stored as
+# polylines of their samples. Most arrays are written straight from the CurveStore rows.
+
+FIGURE_MAGIC = b'SPLFIG\x00\x01'
+FIGURE_VERSION = 2
+ALIGNMENT = 64
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def figure_arrays(curves):
+    # The arrays of a binary figure for a CurveStore, views of its rows where possible
+    count = curves.count
+    types = curves.types[:count].copy()
+    control_offsets = curves.control_offsets[:count + 1]
+    polylines = np.diff(control_offsets) == 0
+    if not np.any(polylines):
+        offsets = control_offsets
+        control_points = curves.control_points[:curves.control_count]
+        weights = curves.weights[:curves.control_count]
+    else:
+        # Curves without control points get their samples as the polygon, gathered point by point
+        types[polylines] = CURVE_TYPES.index('Polyline')
+        sizes = np.where(polylines, np.diff(curves.offsets[:count + 1]), np.diff(control_offsets))
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        rows = np.repeat(np.arange(count), sizes)
+        within = np.arange(offsets[-1]) - offsets[rows]
+        from_samples = polylines[rows]
+        control_points = np.empty((offsets[-1], 2))
+        weights = np.ones(offsets[-1])
+        sources = (control_offsets[rows] + within)[~from_samples]
+        control_points[~from_samples] = curves.control_points[sources]
+        weights[~from_samples] = curves.weights[sources]
+        control_points[from_samples] = curves.vertices[(curves.offsets[rows] + within)[from_samples]]
+
+    return {
+        'types': types,
+        'offsets': np.asarray(offsets, dtype=np.int64),
+        'control_points': control_points,
+        'colors': curves.colors[:count],
+        'bg_colors': curves.bg_colors[:count],
+        'tolerances': curves.tolerances[:count],
+        'degrees': curves.degrees[:count],
+        'knot_types': curves.knot_types[:count],
+        'weights': weights,
+    }
+
+def write_figure_binary(file_path, curves):
+    write_figure_arrays(file_path, figure_arrays(curves))
+
+def write_figure_arrays(file_path, arrays):
+    # Writes the arrays of figure_arrays() (e.g. copied for writing them on another thread)
+    count = len(arrays['types'])
+    # The header size depends on the array offsets it contains, so grow the space
+    # reserved for it until the header fits
+    descriptors = {name: {'dtype': array.dtype.str, 'shape': list(array.shape)} for name, array in arrays.items()}
+    header_space = ALIGNMENT
+    while True:
+        offset = header_space
+        for name, array in arrays.items():
+            descriptors[name]['offset'] = offset
+            offset = _aligned(offset + array.nbytes)
+        header = json.dumps({'version': FIGURE_VERSION, 'curves': count, 'arrays': descriptors}).encode('utf-8')
+        if len(FIGURE_MAGIC) + 8 + len(header) <= header_space:
+            break
+        header_space = _aligned(len(FIGURE_MAGIC) + 8 + len(header))
+
+    temporary_path = file_path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(FIGURE_MAGIC)
+        file.write(np.uint64(len(header)).tobytes())
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(descriptors[name]['offset'])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(offset)
+    os.replace(temporary_path, file_path)
+
+def open_figure_binary(file_path):
+    # Maps every array of a binary figure into memory without reading it
+    with open(file_path, 'rb') as file:
+        if file.read(len(FIGURE_MAGIC)) != FIGURE_MAGIC:
+            raise ValueError(f"{file_path} is not a binary figure")
+        header_length = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+        header = json.loads(file.read(header_length).decode('utf-8'))
+    if header.get('version') != FIGURE_VERSION:
+        raise ValueError(f"{file_path} is a binary figure of an unsupported version")
+    arrays = {}
+    for name, descriptor in header['arrays'].items():
+        shape = tuple(descriptor['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=descriptor['dtype'])
+        else:
+            arrays[name] = np.memmap(file_path, dtype=descriptor['dtype'], mode='r',
+                                     offset=descriptor['offset'], shape=shape)
+    return arrays
+
+def figure_settings(arrays):
+    # Per-curve settings of a binary figure as Python lists
+    offsets = arrays['offsets'].tolist()
+    return {
+        'offsets': offsets,
+        'types': [CURVE_TYPES[index] for index in arrays['types'].tolist()],
+        'tolerances': [None if np.isnan(tolerance) else tolerance for tolerance in arrays['tolerances'].tolist()],
+        'degrees': arrays['degrees'].tolist(),
+        'knot_types': [KNOT_TYPES[index] for index in arrays['knot_types'].tolist()],
+    }
+
+def _curve_weights(arrays, settings, i):
+    if settings['types'][i] != 'B-spline':
+        return None
+    offsets = settings['offsets']
+    curve_weights = np.asarray(arrays['weights'][offsets[i]:offsets[i + 1]])
+    return None if np.all(curve_weights == 1.0) else curve_weights
+
+def _within_control_box(arrays, settings, i):
+    # Rational B-splines stay in the control polygon's bounding box only with positive weights
+    weights = _curve_weights(arrays, settings, i)
+    return settings['types'][i] in LAZY_CURVE_TYPES and (weights is None or np.all(weights > 0))
+
+def tessellate_figure(arrays, settings, indices):
+    # Samples of the given curves of a binary figure, in the order of indices
+    offsets, types, tolerances = settings['offsets'], settings['types'], settings['tolerances']
+    control_points = arrays['control_points']
+    samples = {}
+    # Uniformly sampled Bézier curves of the same degree are evaluated together
+    groups = {}
+    for i in indices:
+        if types[i] == 'Bézier' and tolerances[i] is None and offsets[i + 1] - offsets[i] > 1:
+            groups.setdefault(offsets[i + 1] - offsets[i], []).append(i)
+    for size, group in groups.items():
+        polygons = np.asarray(control_points[np.add.outer(np.take(offsets, group), np.arange(size))])
+        samples.update(zip(group, bezier_curves_batch(polygons, CURVE_SAMPLES)))
+    for i in indices:
+        if i not in samples:
+            tolerance = tolerances[i]
+            samples[i] = tessellate(np.asarray(control_points[offsets[i]:offsets[i + 1]]), types[i], tolerance is not None,
+                                    tolerance, settings['degrees'][i], settings['knot_types'][i],
+                                    _curve_weights(arrays, settings, i))[1]
+    return [samples[i] for i in indices]
+
+def figure_store(arrays, settings, indices, samples):
+    # CurveStore with the given curves of a binary figure (in that order) and their samples;
+    # curves whose samples are None are appended lazily
+    offsets = settings['offsets']
+    curves = CurveStore(max(sum(len(points) for points in samples if points is not None), 1), max(len(indices), 1),
+                        max(sum(offsets[i + 1] - offsets[i] for i in indices), 1))
+    for i, points in zip(indices, samples):
+        curves.append(np.zeros((0, 2)) if points is None else points, arrays['colors'][i], arrays['bg_colors'][i],
+                      settings['types'][i], arrays['control_points'][offsets[i]:offsets[i + 1]],
+                      settings['tolerances'][i], settings['degrees'][i], settings['knot_types'][i],
+                      _curve_weights(arrays, settings, i), lazy=points is None)
+    return curves
+
+def figure_from_arrays(arrays, lazy=False):
+    # Tessellates every curve of a binary figure into a CurveStore (scheduler.TessellationScheduler
+    # does the same on worker processes). With lazy, the curves lying within their control
+    # polygon's bounding box are tessellated when first drawn instead
+    settings = figure_settings(arrays)
+    indices = list(range(len(settings['types'])))
+    eager = [i for i in indices if not (lazy and _within_control_box(arrays, settings, i))]
+    samples = dict(zip(eager, tessellate_figure(arrays, settings, eager)))
+    return figure_store(arrays, settings, indices, [samples.get(i) for i in indices])
+
+def read_figure_binary(file_path, lazy=False):
+    return figure_from_arrays(open_figure_binary(file_path), lazy)
+
+def is_binary_figure(file_path):
+    with open(file_path, 'rb') as file:
+        return file.read(len(FIGURE_MAGIC)) == FIGURE_MAGIC
+
+def read_figure(file_path):
+    if is_binary_figure(file_path):
+        return read_figure_binary(file_path)
+    return read_figure_csv(file_path)
+
+def write_figure(file_path, curves):
+    if file_path.lower().endswith('.spf'):
+        write_figure_binary(file_path, curves)
+    else:
+        write_figure_csv(file_path, curves)
+
+def convert_csv_to_binary(csv_path, binary_path):
+    write_figure_binary(binary_path, read_figure_csv(csv_path))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert CSV figures to the binary figure format.")
+    parser.add_argument('csv_path')
+    parser.add_argument('binary_path', nargs='?', help="defaults to the CSV path with an .spf extension")
+    args = parser.parse_args()
+    convert_csv_to_binary(args.csv_path, args.binary_path or os.path.splitext(args.csv_path)[0] + '.spf')
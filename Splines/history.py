@@ -0,0 +1,74 @@
+from collections import deque
+
+import numpy as np
+
+# Command-based undo/redo.
+# Every edit is a Command holding two closures, one applying the edit and one reverting it,
+# and the approximate number of bytes that only the history keeps alive. Commands keep
+# references to the curves and point lists they replaced rather than copies, so unchanged
+# data is shared with the scene and between entries. When the total size goes over the
+# memory limit the oldest entries are dropped.
+
+POINT_BYTES = 112  # A control point is a list of two floats
+
+def points_size(points):
+    if isinstance(points, np.ndarray):
+        return points.nbytes
+    return len(points) * POINT_BYTES
+
+class Command:
+    def __init__(self, name, do, undo, size=0):
+        self.name = name
+        self.do = do
+        self.undo = undo
+        self.size = size
+
+class History:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0  # Total size of the commands on both stacks
+
+    def execute(self, command):
+        command.do()
+        self.record(command)
+
+    def record(self, command):
+        # Adds a command whose edit has already been applied
+        for undone in self.redo_stack:
+            self.size -= undone.size
+        self.redo_stack.clear()
+        self.undo_stack.append(command)
+        self.size += command.size
+        self.trim()
+
+    def trim(self):
+        # The most recent entry is kept even when it alone is over the limit
+        while self.size > self.max_bytes and len(self.undo_stack) > 1:
+            self.size -= self.undo_stack.popleft().size
+
+    def set_limit(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.trim()
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.undo()
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.do()
+        self.undo_stack.append(command)
+        return command
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
@@ -0,0 +1,43 @@
+import hashlib
+import os
+import tkinter as tk
+
+# Button icons for the control panel, resized once and cached as PNG files.
+# The cache key is the source image's path, modification time and file size plus the icon
+# size, so an edited image is resized again. On a cache hit Tk reads the small PNG itself and
+# PIL is not even imported. Icons used more than once (e.g. the save and load images) are
+# only loaded once per run.
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                         'spline-curves', 'icons')
+ICON_DIR = os.path.dirname(os.path.abspath(__file__))  # Relative icon paths are next to the editor
+
+_icons = {}
+
+def cache_path(path, size):
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.png')
+
+def resize(path, size):
+    from PIL import Image
+    with Image.open(path) as image:
+        return image.resize(size, Image.LANCZOS)
+
+def load_icon(path, size=(30, 30)):
+    path = os.path.join(ICON_DIR, path)
+    if (path, size) in _icons:
+        return _icons[path, size]
+    cached = cache_path(path, size)
+    if not os.path.exists(cached):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            resize(path, size).save(cached + '.tmp', 'PNG')
+            os.replace(cached + '.tmp', cached)  # Another instance never reads a half-written icon
+        except OSError:
+            # Read-only cache directory: resize on every launch, as before
+            from PIL import ImageTk
+            _icons[path, size] = ImageTk.PhotoImage(resize(path, size))
+            return _icons[path, size]
+    _icons[path, size] = tk.PhotoImage(file=cached)
+    return _icons[path, size]
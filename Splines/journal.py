@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from bspline import KNOT_TYPES
+from curve_store import CURVE_TYPES, CurveStore
+from figure_io import figure_arrays, figure_from_arrays, open_figure_binary, write_figure_arrays
+
+try:
+    import fcntl
+except ImportError:  # Windows: journal directories are not locked
+    fcntl = None
+
+# Autosave of the edited figure as an append-only journal, recovered when the editor starts.
+# Every change of the scene (a curve finalized or removed, a control point added, moved or
+# removed, the mode, a reset) is appended as one short JSON line and flushed, so autosaving
+# costs about as much as the edit itself; replaced control points only take the points that
+# changed. Undo and redo are journaled as the changes they make.
+# Changes that replace the scene in bulk (a loaded figure, an undone reset) only leave a
+# 'scene' marker; the whole scene is saved by the next compaction.
+#
+# Compaction starts a new generation: the curves are copied and written as a binary figure
+# (see figure_io) on a background thread, the control points and mode go into the header of
+# the generation's journal, which takes every later change. Once the snapshot is written, the
+# older generations are removed. Recovery starts from the newest generation whose snapshot was
+# completely written, replays its journal and any newer ones, and reads the recovered curves
+# like an opened binary figure, tessellating them when they are first drawn.
+
+JOURNAL_VERSION = 1
+JOURNAL_DIR = os.path.join(os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state'),
+                           'spline-curves', 'journal')
+COMPACT_RECORDS = 5000  # Changes journaled before the journal is compacted
+
+def journal_path(directory, generation):
+    return os.path.join(directory, f"journal-{generation:08d}.jsonl")
+
+def snapshot_path(directory, generation):
+    return os.path.join(directory, f"snapshot-{generation:08d}.spf")
+
+def generations(directory):
+    # Generations with a journal in directory, oldest first
+    names = (re.fullmatch(r'journal-(\d+)\.jsonl', name) for name in os.listdir(directory))
+    return sorted(int(match.group(1)) for match in names if match)
+
+def read_journal(file_path):
+    # Header and records of a journal; a line torn by a crash ends it
+    entries = []
+    with open(file_path) as file:
+        for line in file:
+            if not line.endswith('\n'):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    if not entries or entries[0].get('version') != JOURNAL_VERSION:
+        return None, []
+    return entries[0], entries[1:]
+
+def curve_record(curve):
+    # A finalized curve by its control polygon and settings; curves known only by their samples
+    # are journaled as polylines of them, like in a binary figure
+    control_points, curve_type = curve.control_points, curve.type
+    if control_points is None:
+        control_points, curve_type = curve.points, 'Polyline'
+    weights = curve.weights
+    return {'type': curve_type, 'points': np.asarray(control_points, dtype=float).tolist(),
+            'color': curve.color.tolist(), 'bg_color': curve.bg_color.tolist(), 'tolerance': curve.tolerance,
+            'degree': curve.degree, 'knot_type': curve.knot_type,
+            'weights': None if weights is None else weights.tolist()}
+
+def record_arrays(records):
+    # The arrays of a binary figure with the journaled curves
+    polygons = [np.asarray(record['points'], dtype=float).reshape(-1, 2) for record in records]
+    return {
+        'types': np.array([CURVE_TYPES.index(record['type']) for record in records], dtype=np.uint8),
+        'offsets': np.cumsum([0] + [len(polygon) for polygon in polygons], dtype=np.int64),
+        'control_points': np.concatenate(polygons) if polygons else np.zeros((0, 2)),
+        'colors': np.array([record['color'] for record in records], dtype=np.float32).reshape(-1, 3),
+        'bg_colors': np.array([record['bg_color'] for record in records], dtype=np.float32).reshape(-1, 4),
+        'tolerances': np.array([np.nan if record['tolerance'] is None else record['tolerance'] for record in records]),
+        'degrees': np.array([record['degree'] for record in records], dtype=np.uint8),
+        'knot_types': np.array([KNOT_TYPES.index(record['knot_type']) for record in records], dtype=np.uint8),
+        'weights': np.concatenate([np.ones(len(polygon)) if record['weights'] is None else record['weights']
+                                   for record, polygon in zip(records, polygons)]) if records else np.zeros(0),
+    }
+
+def replay(state, records):
+    # Applies journaled changes to state: the number of snapshot curves kept, the curve records
+    # added after them, the control points and the mode. False if a 'scene' marker stopped it,
+    # the snapshot with that scene was never written
+    kept, added, points, mode = state['kept'], state['added'], state['points'], state['mode']
+    for record in records:
+        op = record['op']
+        if op == 'curve':
+            added.append(record)
+        elif op == 'pop':
+            if added:
+                added.pop()
+            else:
+                kept -= 1
+        elif op == 'clear':
+            kept, added = 0, []
+        elif op == 'points':
+            # The points after the first keep were replaced
+            points = points[:record['keep']] + record['points']
+        elif op == 'add_point':
+            points.append(record['point'])
+        elif op == 'add_points':
+            points.extend(record['points'])
+        elif op == 'pop_point':
+            points.pop()
+        elif op == 'move_point':
+            points[record['index']] = record['point']
+        elif op == 'mode':
+            mode = record['mode']
+        elif op == 'scene':
+            state.update(kept=kept, added=added, points=points, mode=mode)
+            return False
+    state.update(kept=kept, added=added, points=points, mode=mode)
+    return True
+
+def recover(directory):
+    # The journaled scene as (curves, control points, mode), None if nothing was journaled
+    if not os.path.isdir(directory):
+        return None
+    journals = [(generation, *read_journal(journal_path(directory, generation))) for generation in generations(directory)]
+    journals = [journal for journal in journals if journal[1] is not None]
+    usable = [index for index, (generation, header, _) in enumerate(journals)
+              if header['curves'] == 0 or os.path.exists(snapshot_path(directory, generation))]
+    if not usable:
+        return None
+    generation, header, _ = journals[usable[-1]]
+    arrays = open_figure_binary(snapshot_path(directory, generation)) if header['curves'] else None
+    state = {'kept': header['curves'], 'added': [], 'points': header['points'], 'mode': header['mode']}
+    for _, _, records in journals[usable[-1]:]:
+        if not replay(state, records):
+            break
+
+    added = record_arrays(state['added'])
+    kept = state['kept']
+    if kept:
+        # Snapshot curves that were kept, followed by the journaled ones
+        controls = int(arrays['offsets'][kept])
+        added['offsets'] = np.concatenate((arrays['offsets'][:kept], added['offsets'] + controls))
+        for name in added:
+            if name in ('control_points', 'weights'):
+                added[name] = np.concatenate((arrays[name][:controls], added[name]))
+            elif name != 'offsets':
+                added[name] = np.concatenate((arrays[name][:kept], added[name]))
+    curves = figure_from_arrays(added, lazy=True) if len(added['types']) else CurveStore()
+    return curves, state['points'], state['mode']
+
+class FigureJournal:
+    def __init__(self, directory=JOURNAL_DIR, compact_records=COMPACT_RECORDS):
+        # Raises OSError if the directory can't be written or another editor journals to it
+        self.directory = directory
+        self.compact_records = compact_records
+        self.records = 0  # Changes in the current generation's journal
+        self.error = None  # Error of the last snapshot, whose older generations were kept
+        os.makedirs(directory, exist_ok=True)
+        self._lock = open(os.path.join(directory, 'lock'), 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock.close()
+                raise
+        existing = generations(directory)
+        self.generation = existing[-1] if existing else 0
+        self._file = None  # Nothing is journaled before the first compaction
+        self._scene_changed = False
+        self._snapshot = None  # Thread writing the last snapshot
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def record(self, op, **fields):
+        if self._file is not None:
+            self._write({'op': op, **fields})
+            self.records += 1
+
+    def record_curve(self, curve):
+        self.record('curve', **curve_record(curve))
+
+    def scene_changed(self):
+        # The scene was replaced in bulk, it is saved by the next compaction
+        if not self._scene_changed:
+            self._scene_changed = True
+            self.record('scene')
+
+    @property
+    def due(self):
+        # A compaction is needed and the previous one has finished
+        return ((self._scene_changed or self.records >= self.compact_records) and
+                (self._snapshot is None or not self._snapshot.is_alive()))
+
+    def compact(self, curves, points, mode):
+        # Starts a new generation with the given scene; the curves are copied here, since the
+        # scene keeps changing while the snapshot is written
+        if self._snapshot is not None:
+            self._snapshot.join()
+        arrays = {name: np.array(array) for name, array in figure_arrays(curves).items()} if len(curves) else None
+        if self._file is not None:
+            self._file.close()
+        self.generation += 1
+        self._file = open(journal_path(self.directory, self.generation), 'w')
+        self._write({'version': JOURNAL_VERSION, 'curves': len(curves), 'points': [list(point) for point in points],
+                     'mode': mode})
+        self.records = 0
+        self._scene_changed = False
+        self._snapshot = threading.Thread(target=self._write_snapshot, args=(self.generation, arrays), daemon=True)
+        self._snapshot.start()
+
+    def _write_snapshot(self, generation, arrays):
+        try:
+            if arrays is not None:
+                write_figure_arrays(snapshot_path(self.directory, generation), arrays)
+            for old in generations(self.directory):
+                if old < generation:
+                    for path in (journal_path(self.directory, old), snapshot_path(self.directory, old)):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self.error = None
+        except OSError as error:
+            self.error = error
+
+    def close(self):
+        # The journal stays on disk, the next start recovers it
+        if self._snapshot is not None:
+            self._snapshot.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._lock.close()
@@ -0,0 +1,57 @@
+import queue
+import threading
+
+# Runs a streaming reader (see figure_io.iter_points / iter_figure_csv) on a worker thread.
+# The UI thread collects finished batches with take() once per frame, so neither the Tk panel
+# nor the pygame window stalls while a large file is parsed.
+
+class BackgroundLoader:
+    def __init__(self, reader, file_path, max_pending=16):
+        self.file_path = file_path
+        self.progress = 0.0
+        self.error = None
+        self.cancelled = threading.Event()
+        self._batches = queue.Queue(maxsize=max_pending)  # Bounded, so parsing can't run far ahead of the UI
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(reader,), daemon=True)
+        self._thread.start()
+
+    def _run(self, reader):
+        try:
+            for batch, progress in reader(self.file_path):
+                if not self._put(batch):
+                    break
+                self.progress = progress
+        except Exception as error:
+            self.error = error
+        finally:
+            self._finished.set()
+
+    def _put(self, batch):
+        while not self.cancelled.is_set():
+            try:
+                self._batches.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def take(self, limit):
+        # Returns at most limit parsed batches without blocking, nothing once cancelled
+        batches = []
+        if self.cancelled.is_set():
+            return batches
+        while len(batches) < limit:
+            try:
+                batches.append(self._batches.get_nowait())
+            except queue.Empty:
+                break
+        return batches
+
+    @property
+    def done(self):
+        # Cancelled, or finished with every batch taken
+        return self._finished.is_set() and (self.cancelled.is_set() or self._batches.empty())
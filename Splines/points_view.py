@@ -0,0 +1,86 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+# Virtualized list of control points for the Points tab.
+# The listbox only ever holds the rows that fit on screen; the scrollbar is driven by hand
+# from the length of the point list. refresh() diffs the rows that should be visible against
+# the rows currently shown, so an append, pop or clear costs O(visible rows) instead of a
+# rebuild of the whole list.
+
+class PointsView:
+    def __init__(self, parent, get_points, **listbox_options):
+        self.get_points = get_points
+        self.first = 0  # Index of the first point shown
+        self.total = 0
+        self.shown = []  # Text of the rows currently in the listbox
+
+        self.frame = tk.Frame(parent, bg=listbox_options.get('bg', "#000000"))
+        self.scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.listbox = tk.Listbox(self.frame, activestyle='none', **listbox_options)
+        self.listbox.pack(side=tk.LEFT, expand=True, fill='both')
+
+        linespace = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace')
+        self.row_height = linespace + 2 * int(self.listbox.cget('selectborderwidth')) + 1
+
+        self.listbox.bind('<Configure>', lambda event: self.refresh())
+        self.listbox.bind('<MouseWheel>', lambda event: self.scroll_rows(-1 if event.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda event: self.scroll_rows(-1))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll_rows(1))
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def visible_rows(self):
+        return max(1, self.listbox.winfo_height() // self.row_height)
+
+    def scroll_rows(self, rows):
+        self.first += rows
+        self.refresh(follow=False)
+        return 'break'
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.first = int(float(amount) * self.total)
+        elif unit == 'pages':
+            self.first += int(amount) * self.visible_rows()
+        else:
+            self.first += int(amount)
+        self.refresh(follow=False)
+
+    def refresh(self, follow=True):
+        # With follow, a view that showed the end of the list keeps showing it as points are added
+        points = self.get_points()
+        rows = self.visible_rows()
+        if follow and self.first + rows >= self.total:
+            self.first = len(points) - rows
+        self.total = len(points)
+        self.first = max(0, min(self.first, self.total - rows))
+
+        rows = [f"x={point[0]}, y={point[1]}" for point in points[self.first:self.first + rows]]
+        self._show(rows)
+
+        if self.total:
+            self.scrollbar.set(self.first / self.total, (self.first + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _show(self, rows):
+        shown = self.shown
+        if rows == shown:
+            return
+        # Scrolled down by a few rows (typical when following appended points): drop rows from the top
+        for shift in range(1, min(len(shown), 4)):
+            if shown[shift:] == rows[:len(shown) - shift]:
+                self.listbox.delete(0, shift - 1)
+                shown = shown[shift:]
+                break
+        # Keep the common prefix, replace everything after it
+        common = 0
+        while common < min(len(shown), len(rows)) and shown[common] == rows[common]:
+            common += 1
+        if common < len(shown):
+            self.listbox.delete(common, tk.END)
+        if common < len(rows):
+            self.listbox.insert(tk.END, *rows[common:])
+        self.shown = rows
@@ -0,0 +1,67 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Per-stage frame timing for the main loop.
+# Every loop iteration is one record: wall time per named stage, counters (vertices,
+# curves, ...) and whether a frame was actually drawn. The last `history` records are
+# kept in a ring buffer for the HUD and can be dumped to JSON for offline analysis.
+
+class FrameProfiler:
+    def __init__(self, history=600):
+        self.records = deque(maxlen=history)
+        self._stages = {}
+        self._counters = {}
+        self._start = None
+
+    def begin_frame(self):
+        self._start = time.perf_counter()
+        self._stages = {}
+        self._counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value):
+        self._counters[name] = value
+
+    def end_frame(self, drawn):
+        end = time.perf_counter()
+        self.records.append({'start': self._start, 'end': end, 'drawn': drawn,
+                             'stages': self._stages, 'counters': self._counters})
+
+    def drawn_frames(self):
+        return [record for record in self.records if record['drawn']]
+
+    def summary(self):
+        frames = self.drawn_frames()
+        if not frames:
+            return {'frames': 0}
+        times = np.array([frame['end'] - frame['start'] for frame in frames]) * 1000.0
+        span = frames[-1]['end'] - frames[0]['start']
+        stages = {}
+        for frame in frames:
+            for name, seconds in frame['stages'].items():
+                stages.setdefault(name, []).append(seconds * 1000.0)
+        return {
+            'frames': len(frames),
+            'fps': len(frames) / span if span > 0 else 0.0,
+            'frame_ms': {'mean': float(times.mean()), 'p50': float(np.percentile(times, 50)),
+                         'p95': float(np.percentile(times, 95)), 'p99': float(np.percentile(times, 99)),
+                         'max': float(times.max())},
+            'stage_ms': {name: {'mean': float(np.mean(values)), 'p95': float(np.percentile(values, 95))}
+                         for name, values in stages.items()},
+            'counters': frames[-1]['counters'],
+        }
+
+    def dump(self, file_path):
+        with open(file_path, 'w') as file:
+            json.dump({'summary': self.summary(), 'records': list(self.records)}, file, indent=1)
@@ -0,0 +1,94 @@
+import json
+import time
+
+import pygame
+
+# Recording and replay of editor sessions, for reproducible performance tests.
+# A session file is JSON lines: a header, then one line per main loop iteration that had any
+# input, with its time since the start, whether a file was loading, the pygame input events
+# and the panel actions it ran (by name, with their arguments, e.g. the seed of a random
+# curve or the path picked in a file dialog). Replay feeds the same input back iteration by
+# iteration, as fast as the frames can be drawn. The replayed editor reads the time of the
+# iteration being replayed instead of the clock (for the animation), so it ends in the state
+# the recorded session was in however fast the frames went.
+
+SESSION_VERSION = 1
+INPUT_EVENTS = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.MOUSEWHEEL,
+                pygame.KEYDOWN, pygame.KEYUP)
+EVENT_ATTRIBUTES = ('pos', 'rel', 'buttons', 'button', 'x', 'y', 'flipped', 'precise_x', 'precise_y',
+                    'key', 'mod', 'unicode', 'scancode')
+
+def event_to_json(event):
+    attributes = {name: getattr(event, name) for name in EVENT_ATTRIBUTES if hasattr(event, name)}
+    if event.type == pygame.MOUSEWHEEL:
+        # Wheel events don't say where the mouse was, zooming needs it
+        attributes['pos'] = pygame.mouse.get_pos()
+    return {'type': pygame.event.event_name(event.type), **attributes}
+
+def event_from_json(entry):
+    attributes = dict(entry)
+    event_type = getattr(pygame, attributes.pop('type').upper())
+    for name in ('pos', 'rel', 'buttons'):
+        if name in attributes:
+            attributes[name] = tuple(attributes[name])
+    return pygame.event.Event(event_type, attributes)
+
+class SessionRecorder:
+    def __init__(self, file_path, size):
+        self.file_path = file_path
+        self.start = time.perf_counter()
+        self._file = open(file_path, 'w')
+        self._events = []
+        self._actions = []
+        self._write({'version': SESSION_VERSION, 'size': list(size), 'time': time.time()})
+
+    def _write(self, entry):
+        # One line per entry, flushed, so a session survives a crash of the editor
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def events(self, events):
+        self._events.extend(event_to_json(event) for event in events if event.type in INPUT_EVENTS)
+
+    def action(self, name, args):
+        self._actions.append([name, list(args)])
+
+    def end_frame(self, loading):
+        if self._events or self._actions:
+            self._write({'t': time.perf_counter() - self.start, 'loading': loading,
+                         'events': self._events, 'actions': self._actions})
+            self._events, self._actions = [], []
+
+    def close(self):
+        self._file.close()
+
+class SessionPlayer:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path) as file:
+            lines = [json.loads(line) for line in file if line.strip()]
+        if not lines or lines[0].get('version') != SESSION_VERSION:
+            raise ValueError(f"{file_path} is not a recorded session")
+        self.header = lines[0]
+        self.frames = lines[1:]
+        self.index = 0
+        self.time = 0.0  # Recorded time of the last iteration replayed
+
+    @property
+    def done(self):
+        return self.index >= len(self.frames)
+
+    @property
+    def duration(self):
+        # Length of the recorded session in seconds
+        return self.frames[-1]['t'] if self.frames else 0.0
+
+    def next_frame(self, loading):
+        # Events and actions of the next recorded iteration, or None while waiting. Input given
+        # after a load had finished waits until the replayed load has finished too.
+        if self.done or (loading and not self.frames[self.index]['loading']):
+            return None
+        frame = self.frames[self.index]
+        self.index += 1
+        self.time = frame['t']
+        return {'events': [event_from_json(entry) for entry in frame['events']], 'actions': frame['actions']}
@@ -0,0 +1,447 @@
+import time
+
+import numpy as np
+from OpenGL.GL import *
+
+from curves import tessellate
+from figure_io import LAZY_CURVE_TYPES
+
+# Retained-mode renderer for finalized curves.
+# Every curve is a line strip stored in one vertex buffer with a per-vertex color. Appending
+# a curve only uploads its own vertices, undo only shrinks the used ranges, and a frame is
+# drawn with one glMultiDrawArrays call for the outlines (one per run of fills, see below).
+#
+# Filled curves are not triangulated. Their outline is drawn as a triangle fan into the
+# stencil buffer, inverting its lowest bit, which leaves it set exactly where the outline
+# winds an odd number of times (the even-odd rule, also right for self-intersecting
+# outlines). A quad over the curve's bounding box then colors those pixels and clears the
+# bit again. The quads, with the fill color, are kept in a second vertex buffer. Fills whose
+# bounding boxes don't overlap share one stencil pass, so consecutive curves are grouped
+# into runs of disjoint fills when they are added. The outlines are drawn after the fills of
+# the run they follow, so a run also stops at a fill overlapping an outline drawn after it:
+# later curves cover earlier ones as if every curve was drawn by itself.
+# Appended curves are only read (and, for lazily loaded figures and at levels of detail other
+# than 0, tessellated) when first drawn.
+# Curves outside the visible rectangle (by the bounding boxes kept in the CurveStore) are
+# left out of the draw calls. A whole store can be added at once with extend().
+
+def vbo_supported():
+    try:
+        version = glGetString(GL_VERSION)
+    except Exception:
+        return False
+    if not version or not bool(glGenBuffers) or not bool(glMultiDrawArrays):
+        return False
+    major, minor = version.split()[0].split(b'.')[:2]
+    return (int(major), int(minor)) >= (1, 5)
+
+MAX_FILL_RUN = 256  # Curves spanned by one run of fills at most
+
+def begin_fill_mask():
+    # Triangle fans drawn now flip the stencil bit of the pixels they cover, without drawing
+    glEnable(GL_STENCIL_TEST)
+    glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+    glStencilMask(1)
+    glStencilFunc(GL_ALWAYS, 0, 1)
+    glStencilOp(GL_KEEP, GL_KEEP, GL_INVERT)
+
+def begin_fill_cover():
+    # Quads drawn now color the pixels with the stencil bit set and clear it
+    glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+    glStencilFunc(GL_NOTEQUAL, 0, 1)
+    glStencilOp(GL_ZERO, GL_ZERO, GL_ZERO)
+
+def end_fill():
+    glDisable(GL_STENCIL_TEST)
+
+def bbox_quad(bbox):
+    left, bottom, right, top = bbox
+    return np.array([[left, bottom], [right, bottom], [right, top], [left, top]], dtype=np.float32)
+
+def draw_fill(points, color):
+    # Even-odd fill of the region enclosed by points (closed implicitly), from client memory;
+    # for curves drawn without vertex buffers and the curve being edited
+    if len(points) < 3:
+        return
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    begin_fill_mask()
+    glVertexPointer(2, GL_FLOAT, 0, points)
+    glDrawArrays(GL_TRIANGLE_FAN, 0, len(points))
+    begin_fill_cover()
+    glColor4f(*color)
+    quad = bbox_quad((*points.min(axis=0), *points.max(axis=0)))
+    glVertexPointer(2, GL_FLOAT, 0, quad)
+    glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
+    end_fill()
+    glDisableClientState(GL_VERTEX_ARRAY)
+
+def filled(curve):
+    # Decided from the control points of a lazy curve, so that its samples aren't computed here
+    if curve.lazy:
+        return curve.bg_color[3] > 0 and len(curve.control_points) > 2
+    return curve.bg_color[3] > 0 and len(curve.points) > 2
+
+# Level of detail: at level L a curve is tessellated to within LOD_TOLERANCE window pixels
+# at zoom 2 ** L, so it gets coarser when zoomed out and finer when zoomed in. Level 0 is the
+# curve as it was finalized. Curves without control points (figures saved as samples) and
+# polylines have a single level.
+# The samples at other levels are kept in the vertex arrays of the renderer drawing that
+# level, which computes them when a curve is first drawn, so only curves in view are
+# tessellated. A curve caches the samples of one level at most: those computed by the
+# workers of a parallel load until a renderer takes them, or those drawn without vertex buffers.
+LOD_TOLERANCE = 0.25
+LOD_CURVE_TYPES = ('Bézier', 'B-spline', 'Catmull-Rom', 'Piecewise cubic')
+
+def has_levels(curve):
+    return curve.type in LOD_CURVE_TYPES and curve.control_points is not None
+
+def lod_points(curve, level):
+    # Samples of a curve with levels at the given level
+    return tessellate(curve.control_points, curve.type, True, LOD_TOLERANCE / 2.0 ** level,
+                      curve.degree, curve.knot_type, curve.weights)[1]
+
+def cache_lod_points(curve, level, points):
+    # Replaces the samples cached with the curve, of whichever level they were
+    if curve.cache is None:
+        curve.cache = {}
+    curve.cache['lod'] = (level, points)
+
+def cached_lod_points(curve, level, take=False):
+    # The samples of the curve at the given level if they are cached with it, else None;
+    # taken out of the cache with take
+    cached = (curve.cache or {}).get('lod')
+    if cached is None or cached[0] != level:
+        return None
+    if take:
+        del curve.cache['lod']
+    return cached[1]
+
+def lod_samples(curve, level):
+    # Samples of the curve at the given level, cached with it (for drawing without vertex buffers)
+    if level == 0 or not has_levels(curve):
+        return curve.points
+    points = cached_lod_points(curve, level)
+    if points is None:
+        points = lod_points(curve, level)
+        cache_lod_points(curve, level, points)
+    return points
+
+def within_control_box(curve):
+    # Curves whose samples at every level stay in the bounding box of the control polygon
+    return curve.type in LAZY_CURVE_TYPES and (curve.weights is None or np.all(curve.weights > 0))
+
+def control_box(curve):
+    control_points = curve.control_points
+    return np.concatenate([control_points.min(axis=0), control_points.max(axis=0)])
+
+def visible(bbox, bounds):
+    left, bottom, right, top = bounds
+    return bbox[0] <= right and bbox[2] >= left and bbox[1] <= top and bbox[3] >= bottom
+
+class VertexStream:
+    # Growable CPU copy of (position, color) vertices mirrored into two vertex buffers;
+    # only the range written since the last upload is sent to the GPU
+    def __init__(self, color_size, capacity=4096):
+        self.vertices = np.zeros((capacity, 2), dtype=np.float32)
+        self.colors = np.zeros((capacity, color_size), dtype=np.float32)
+        self.count = 0
+        self.uploaded = 0  # Vertices [0, uploaded) are already on the GPU
+        self.buffers = None
+        self.buffer_capacity = 0
+
+    def append(self, points, color):
+        start, end = self.count, self.count + len(points)
+        if end > len(self.vertices):
+            capacity = max(end, 2 * len(self.vertices))
+            self.vertices = np.resize(self.vertices, (capacity, 2))
+            self.colors = np.resize(self.colors, (capacity, self.colors.shape[1]))
+        self.vertices[start:end] = points
+        self.colors[start:end] = color
+        self.count = end
+        return start
+
+    def truncate(self, count):
+        self.count = count
+        self.uploaded = min(self.uploaded, count)
+
+    def upload(self):
+        if self.buffers is None:
+            self.buffers = glGenBuffers(2)
+        arrays = (self.vertices, self.colors)
+        if self.buffer_capacity < len(self.vertices):
+            # The CPU arrays grew, reallocate the buffers and upload everything
+            for buffer, array in zip(self.buffers, arrays):
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                glBufferData(GL_ARRAY_BUFFER, array.nbytes, array, GL_DYNAMIC_DRAW)
+            self.buffer_capacity = len(self.vertices)
+        elif self.uploaded < self.count:
+            for buffer, array in zip(self.buffers, arrays):
+                changed = np.ascontiguousarray(array[self.uploaded:self.count])
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                glBufferSubData(GL_ARRAY_BUFFER, self.uploaded * array.strides[0], changed.nbytes, changed)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.uploaded = self.count
+
+    def bind(self):
+        if self.uploaded < self.count or self.buffer_capacity < len(self.vertices):
+            self.upload()
+        vertex_buffer, color_buffer = self.buffers
+        glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
+        glVertexPointer(2, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, color_buffer)
+        glColorPointer(self.colors.shape[1], GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        if self.buffers is not None:
+            glDeleteBuffers(2, self.buffers)
+            self.buffers = None
+            self.buffer_capacity = 0
+            self.uploaded = 0
+
+class CurveRenderer:
+    def __init__(self, level=0, capacity=4096):
+        self.level = level  # Level of detail the curves are drawn at (see has_levels)
+        self.lines = VertexStream(3, capacity)
+        self.fills = VertexStream(4, capacity)
+        self.firsts = np.zeros(64, dtype=np.int32)
+        self.counts = np.zeros(64, dtype=np.int32)
+        self.fill_firsts = np.zeros(64, dtype=np.int32)  # First vertex of the fill quad (4 vertices if filled)
+        self.fill_runs = np.zeros(64, dtype=np.int64)  # Run of disjoint fills of each curve, -1 if not filled
+        self.line_runs = np.zeros(64, dtype=np.int64)  # Run whose fills are drawn before the outline, -1 for none
+        self.bboxes = np.zeros((64, 4))
+        self.unread = np.zeros(64, dtype=bool)  # Curves whose samples are not in the vertex arrays yet
+        self.lazy = {}  # Handles of the unread curves by index
+        self.run = []  # Filled curves of the last run
+        self.run_start = 0  # First curve of the last run
+        self.run_count = 0  # Runs so far
+        self.curve_count = 0
+        self.drawn_count = 0  # Curves that passed culling in the last draw
+        self.pending = []  # Curves appended since the last draw
+
+    @property
+    def vertex_count(self):
+        return self.lines.count + self.fills.count
+
+    def append(self, curve):
+        self.pending.append(curve)
+
+    def _reserve(self, curves):
+        if self.curve_count + curves > len(self.counts):
+            capacity = max(self.curve_count + curves, 2 * len(self.counts))
+            self.firsts = np.resize(self.firsts, capacity)
+            self.counts = np.resize(self.counts, capacity)
+            self.fill_firsts = np.resize(self.fill_firsts, capacity)
+            self.fill_runs = np.resize(self.fill_runs, capacity)
+            self.line_runs = np.resize(self.line_runs, capacity)
+            self.bboxes = np.resize(self.bboxes, (capacity, 4))
+            self.unread = np.resize(self.unread, capacity)
+
+    def _add_fill(self, index, color):
+        # The fill of curve index joins the last run unless it overlaps a curve of that run
+        box = self.bboxes[index]
+        boxes = self.bboxes[self.run_start:index]
+        if (not self.run or index - self.run_start >= MAX_FILL_RUN or
+                np.any((boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) & (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1]))):
+            self.run = []
+            self.run_start = index
+            self.run_count += 1
+        self.run.append(index)
+        self.fill_runs[index] = self.line_runs[index] = self.run_count - 1
+        self.fills.append(bbox_quad(box), color)
+
+    def _samples(self, curve):
+        # Samples of a curve at the renderer's level and their bounding box, or None and a box
+        # containing them if the curve is read when it is first drawn
+        if self.level == 0 or not has_levels(curve):
+            return (None if curve.lazy else curve.points), curve.bbox
+        points = cached_lod_points(curve, self.level, take=True)
+        if points is None:
+            if within_control_box(curve):
+                return None, control_box(curve)
+            points = lod_points(curve, self.level)
+        return points, np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+    def _store(self, curve):
+        self._reserve(1)
+        index = self.curve_count
+        points, self.bboxes[index] = self._samples(curve)
+        if points is None:
+            # Read when it is first drawn
+            self.firsts[index] = self.counts[index] = 0
+            self.unread[index] = True
+            self.lazy[index] = curve
+        else:
+            self.firsts[index] = self.lines.append(points, curve.color)
+            self.counts[index] = len(points)
+            self.unread[index] = False
+        self.fill_firsts[index] = self.fills.count
+        self.fill_runs[index] = -1
+        self.line_runs[index] = self.run_count - 1
+        if filled(curve):
+            self._add_fill(index, curve.bg_color)
+        self.curve_count += 1
+
+    def extend(self, store, first=0):
+        # Adds curves first.. of a CurveStore with a few array copies instead of one call per curve
+        # (at level 0, the samples at other levels are not in the store)
+        if self.level != 0:
+            for index in range(first, store.count):
+                self.append(store[index])
+            return
+        self.flush()
+        count = store.count - first
+        if count <= 0:
+            return
+        self._reserve(count)
+        start, end = self.curve_count, self.curve_count + count
+        vertex_first, vertex_last = store.offsets[first], store.offsets[store.count]
+        counts = np.diff(store.offsets[first:store.count + 1])
+        base = self.lines.append(store.vertices[vertex_first:vertex_last], np.repeat(store.colors[first:store.count], counts, axis=0))
+        self.firsts[start:end] = store.offsets[first:store.count] - vertex_first + base
+        self.counts[start:end] = counts
+        self.bboxes[start:end] = store.bboxes[first:store.count]
+        # Lazy curves have no samples in the store, they are read when first drawn
+        lazy = store.lazy[first:store.count]
+        self.unread[start:end] = lazy
+        for i in np.flatnonzero(lazy):
+            self.lazy[start + i] = store.handles[first + i]
+        # Only filled curves have a quad, the others get an empty range
+        self.fill_firsts[start:end] = self.fills.count
+        self.fill_runs[start:end] = -1
+        self.line_runs[start:end] = self.run_count - 1
+        controls = np.diff(store.control_offsets[first:store.count + 1])
+        for i in np.flatnonzero((store.bg_colors[first:store.count, 3] > 0) & np.where(lazy, controls > 2, counts > 2)):
+            self._add_fill(start + i, store.bg_colors[first + i])
+            self.fill_firsts[start + i + 1:end] = self.fills.count
+            self.line_runs[start + i + 1:end] = self.run_count - 1
+        self.curve_count = end
+
+    def pop(self):
+        if self.pending:
+            self.pending.pop()
+            return
+        if self.curve_count == 0:
+            return
+        self.curve_count -= 1
+        self.lazy.pop(self.curve_count, None)
+        # Lazy curves are read in drawing order, so the samples of the last curve need not be the
+        # last ones in the vertex arrays
+        ends = self.firsts[:self.curve_count] + self.counts[:self.curve_count]
+        self.lines.truncate(int(ends.max()) if self.curve_count else 0)
+        self.fills.truncate(int(self.fill_firsts[self.curve_count]))
+        if self.run and self.run[-1] == self.curve_count:
+            self.run.pop()
+            if not self.run:
+                # The last run is gone, continue the one before it
+                runs = self.fill_runs[:self.curve_count]
+                self.run_count = int(runs.max()) + 1 if self.curve_count else 0
+                self.run = np.flatnonzero(runs == self.run_count - 1).tolist() if self.run_count else []
+                self.run_start = self.run[0] if self.run else 0
+
+    def clear(self):
+        self.pending.clear()
+        self.curve_count = 0
+        self.lazy.clear()
+        self.run = []
+        self.run_start = 0
+        self.run_count = 0
+        self.lines.truncate(0)
+        self.fills.truncate(0)
+
+    def release(self):
+        # Frees the GPU buffers, e.g. when this renderer is replaced by another one
+        self.lines.release()
+        self.fills.release()
+
+    def flush(self):
+        # Moves the pending curves into the vertex arrays (CPU side only, no GL calls)
+        for curve in self.pending:
+            self._store(curve)
+        self.pending.clear()
+
+    def _visible(self, bounds, first, last):
+        # Indices of curves first..last - 1 intersecting bounds (left, bottom, right, top), None
+        # if that is all of them
+        if bounds is None:
+            return None
+        left, bottom, right, top = bounds
+        boxes = self.bboxes[first:last]
+        shown = np.flatnonzero((boxes[:, 0] <= right) & (boxes[:, 2] >= left) &
+                               (boxes[:, 1] <= top) & (boxes[:, 3] >= bottom)) + first
+        return None if len(shown) == last - first else shown
+
+    def prepare(self, bounds, deadline):
+        # Reads the curves intersecting bounds that are not read yet, until the deadline (a
+        # perf_counter() time); True once all of them are read
+        self.flush()
+        if not self.lazy:
+            return True
+        shown = self._visible(bounds, 0, self.curve_count)
+        return self._read(np.arange(self.curve_count) if shown is None else shown, deadline)
+
+    def draw(self, bounds=None, first=0, last=None):
+        # Draws curves first..last - 1 (all by default) intersecting bounds (left, bottom, right,
+        # top), or all of them
+        self.flush()
+        last = self.curve_count if last is None else last
+        count = last - first
+        shown = self._visible(bounds, first, last)
+        self.drawn_count = count if shown is None else len(shown)
+        if self.drawn_count == 0:
+            return
+        if self.lazy:
+            self._read(np.arange(first, last) if shown is None else shown)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+
+        if not self.fills.count:
+            self.lines.bind()
+            if shown is None:
+                glMultiDrawArrays(GL_LINE_STRIP, np.ascontiguousarray(self.firsts[first:last]),
+                                  np.ascontiguousarray(self.counts[first:last]), count)
+            else:
+                self._draw_lines(shown)
+        else:
+            # Each run's fills, then the outlines drawn after them
+            indices = np.arange(first, last) if shown is None else shown
+            for group in np.split(indices, np.flatnonzero(np.diff(self.line_runs[indices])) + 1):
+                self._draw_fills(group[self.fill_runs[group] >= 0])
+                self._draw_lines(group)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def _draw_lines(self, indices):
+        self.lines.bind()
+        glMultiDrawArrays(GL_LINE_STRIP, np.ascontiguousarray(self.firsts[indices]),
+                          np.ascontiguousarray(self.counts[indices]), len(indices))
+
+    def _read(self, indices, deadline=None):
+        # Tessellates the unread curves among indices into the vertex arrays, until the deadline
+        # if one is given; True once all of them are read
+        for index in indices[self.unread[indices]].tolist():
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            curve = self.lazy.pop(index)
+            points = curve.points if self.level == 0 or not has_levels(curve) else lod_points(curve, self.level)
+            self.firsts[index] = self.lines.append(points, curve.color)
+            self.counts[index] = len(points)
+            self.unread[index] = False
+        return True
+
+    def _draw_fills(self, run):
+        # One stencil pass and one cover pass for the fills of a run of disjoint fills
+        if len(run) == 0:
+            return
+        begin_fill_mask()
+        self.lines.bind()
+        glMultiDrawArrays(GL_TRIANGLE_FAN, np.ascontiguousarray(self.firsts[run]),
+                          np.ascontiguousarray(self.counts[run]), len(run))
+        begin_fill_cover()
+        self.fills.bind()
+        glMultiDrawArrays(GL_TRIANGLE_FAN, np.ascontiguousarray(self.fill_firsts[run]),
+                          np.full(len(run), 4, dtype=np.int32), len(run))
+        end_fill()
@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from figure_io import figure_settings, figure_store, open_figure_binary, tessellate_figure
+from renderer import cache_lod_points, has_levels, lod_points
+
+# Parallel tessellation of a binary figure (.spf) for the editor.
+# The curves are split into chunks which a pool of worker processes tessellates. The figure
+# file is memory-mapped by every worker, so the control points are shared through the page
+# cache instead of being pickled to each process; only the curve indices go out and the
+# float32 samples come back. Chunks are submitted visible curves first (by the bounding box
+# of their control polygon), then by distance to the view, and the first chunks are small so
+# something is drawn after a fraction of the work. When the view is zoomed, the workers also
+# tessellate the curves at its level of detail (see renderer.has_levels), which take() caches
+# with the curves until a renderer takes them. Like loader.BackgroundLoader, finished
+# batches are collected once per frame with take(); taken lists the file index of every curve
+# taken so far, for putting the final scene in file order.
+#
+# Workers are forked: a spawned worker would re-run the editor script on import. A fork only
+# copies the calling thread, so the editor forks them with start_workers() at launch, before it
+# has a GL context, a Tk interpreter or threads of its own that a child would inherit half
+# way. Without workers started then (the launch doesn't need them, or fork is not available),
+# a thread pool does the work instead, still off the UI thread; it is safe to start any time.
+
+FIRST_CHUNK = 64  # Curves per chunk of the first round, doubled every round up to MAX_CHUNK
+MAX_CHUNK = 1024
+MAX_WORKERS = 8  # Processes forked at most, more cores hardly speed up a load
+
+_executors = {}
+_figures = {}  # Figure opened by this worker: path -> (mtime, arrays, settings)
+
+def default_workers():
+    return min(os.cpu_count() or 1, MAX_WORKERS)
+
+def executor(workers):
+    # A pool kept for the lifetime of the editor, so loads don't pay for starting workers: the
+    # processes forked by start_workers(), else threads
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(workers)
+    return _executors[workers]
+
+def start_workers(workers=None):
+    # Forks the worker processes of the pool now, for the loads to come
+    workers = workers or default_workers()
+    if workers in _executors:
+        return _executors[workers]
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+        pool.submit(os.getpid)  # A forking pool starts all its workers with the first task
+        _executors[workers] = pool
+    return executor(workers)
+
+def _open_figure(file_path):
+    mtime = os.path.getmtime(file_path)
+    figure = _figures.get(file_path)
+    if figure is None or figure[0] != mtime:
+        arrays = open_figure_binary(file_path)
+        figure = (mtime, arrays, figure_settings(arrays))
+        _figures.clear()
+        _figures[file_path] = figure
+    return figure
+
+def _concatenate(samples):
+    # The sample count of every curve and all samples back to back
+    counts = np.array([len(points) for points in samples], dtype=np.int64)
+    vertices = np.concatenate(samples).astype(np.float32) if samples else np.zeros((0, 2), dtype=np.float32)
+    return counts, vertices
+
+def _split(counts, vertices):
+    return np.split(vertices, np.cumsum(counts)[:-1])
+
+def _tessellate_chunk(file_path, indices, level):
+    # Runs in a worker; returns the samples of the curves, and their samples at the level of
+    # detail if it isn't 0 (none for curves without levels)
+    _, arrays, settings = _open_figure(file_path)
+    samples = tessellate_figure(arrays, settings, indices)
+    lod_samples = []
+    if level != 0:
+        lod_samples = [lod_points(curve, level) if has_levels(curve) else np.zeros((0, 2))
+                       for curve in figure_store(arrays, settings, indices, samples)]
+    return indices, _concatenate(samples), _concatenate(lod_samples)
+
+def file_order(count, loaded, taken):
+    # Order for CurveStore.reorder putting the loaded curves (handles, in the order they were
+    # taken) back in file order, taken being their file indices; the other curves of the store
+    # (count in all) keep their positions
+    order = np.arange(count)
+    order[sorted(curve.index for curve in loaded)] = [loaded[i].index for i in np.argsort(taken, kind='stable')]
+    return order
+
+def priority_order(control_points, offsets, bounds):
+    # Curve indices, those whose control polygon overlaps bounds first, the rest nearest first
+    counts = np.diff(offsets)
+    starts = np.minimum(offsets[:-1], max(len(control_points) - 1, 0))
+    control_points = np.asarray(control_points)
+    if len(control_points) == 0:
+        return np.arange(len(counts))
+    lows = np.minimum.reduceat(control_points, starts)
+    highs = np.maximum.reduceat(control_points, starts)
+    left, bottom, right, top = bounds
+    overlaps = ((lows[:, 0] <= right) & (highs[:, 0] >= left) & (lows[:, 1] <= top) & (highs[:, 1] >= bottom))
+    centers = (lows + highs) / 2
+    distances = np.hypot(centers[:, 0] - (left + right) / 2, centers[:, 1] - (bottom + top) / 2)
+    distances[counts == 0] = np.inf
+    return np.lexsort((distances, ~overlaps))
+
+def chunks(order, workers):
+    # FIRST_CHUNK curves for each worker, then twice as many every round
+    size, first = FIRST_CHUNK, 0
+    while first < len(order):
+        for _ in range(workers):
+            yield order[first:first + size].tolist()
+            first += size
+        size = min(size * 2, MAX_CHUNK)
+
+class TessellationScheduler:
+    def __init__(self, file_path, bounds, level=0, workers=None):
+        self.file_path = file_path
+        self.level = level  # Level of detail the curves are drawn at
+        self.progress = 0.0
+        self.error = None
+        self.cancelled = threading.Event()
+        self._arrays = open_figure_binary(file_path)
+        self._settings = figure_settings(self._arrays)
+        self._total = len(self._settings['types'])
+        self.taken = []  # File index of every taken curve, in the order they were taken
+        self._results = queue.Queue()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+        order = priority_order(self._arrays['control_points'], self._arrays['offsets'], bounds)
+        workers = workers or default_workers()
+        pool = executor(workers)
+        self._futures = [pool.submit(_tessellate_chunk, file_path, chunk, level) for chunk in chunks(order, workers)]
+        self._pending = len(self._futures)
+        if not self._futures:
+            self._finished.set()
+        for future in self._futures:
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        # Called on a pool thread when a chunk finished (or was cancelled)
+        if not future.cancelled():
+            if future.exception() is not None:
+                self.error = self.error or future.exception()
+                self.cancelled.set()
+            elif not self.cancelled.is_set():
+                self._results.put(future.result())
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._finished.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+    def take(self, limit):
+        # Returns at most limit finished batches as CurveStores without blocking, nothing once cancelled
+        batches = []
+        while len(batches) < limit and not self.cancelled.is_set():
+            try:
+                indices, samples, lod_samples = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self.taken.extend(indices)
+            batch = figure_store(self._arrays, self._settings, indices, _split(*samples))
+            if self.level != 0:
+                for curve, points in zip(batch, _split(*lod_samples)):
+                    if has_levels(curve):
+                        cache_lod_points(curve, self.level, points)
+            batches.append(batch)
+        self.progress = len(self.taken) / max(self._total, 1)
+        return batches
+
+    @property
+    def done(self):
+        # Cancelled, or finished with every batch taken
+        return self._finished.is_set() and (self.cancelled.is_set() or self._results.empty())
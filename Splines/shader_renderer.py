@@ -0,0 +1,343 @@
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+
+from bspline import KNOT_TYPES
+from curve_store import CURVE_TYPES
+from curves import CURVE_SAMPLES
+from renderer import CurveRenderer
+
+# Curve renderer evaluating Bézier and B-spline outlines on the GPU.
+# Only the control points of these curves are uploaded, as homogeneous (x * w, y * w, w)
+# texels of a buffer texture, next to a table with every curve's first control point, count,
+# degree and kind. A vertex shader evaluates the curve at sample gl_VertexID of instance
+# gl_InstanceID (de Casteljau for Bézier curves, de Boor for B-splines), so the sample density
+# is a number set per frame instead of a CPU tessellation. Curves drawn with the same number
+# of samples go in one instanced draw.
+#
+# Everything else goes through a CurveRenderer, at the renderer's level of detail: other curve
+# types, curves known only by their samples, Bézier curves over MAX_BEZIER_POINTS points,
+# B-splines of degree over MAX_DEGREE and filled curves (their stencil fill is drawn from the
+# CPU samples anyway). The two are drawn by turns, a run of consecutive curves at a time, so
+# curves still cover the earlier ones.
+#
+# Needs OpenGL 3.1 (buffer textures, instancing, GLSL 1.40); use shaders_supported() first.
+
+MAX_BEZIER_POINTS = 32
+MAX_DEGREE = 5
+MAX_SAMPLES_PER_PIECE = 1024
+
+# Kind of every GPU curve: Bézier, or a B-spline with the knot vector of that type
+CURVE_KINDS = {'Bézier': 0, 'clamped': 1, 'open': 2, 'uniform': 3}
+
+VERTEX_SHADER = f"""
+#version 140
+uniform samplerBuffer controls;
+uniform isamplerBuffer curves;
+uniform samplerBuffer colors;
+uniform isamplerBuffer instances;
+uniform int base;
+uniform int vertices;
+uniform mat4 projection;
+out vec3 color;
+
+vec3 control_point(int first, int count, int index) {{
+    // Closed B-splines wrap around the control polygon
+    return texelFetch(controls, first + index % count).xyz;
+}}
+
+float knot(int i, int degree, int count, int kind) {{
+    // bspline.knot_vector, shifted so the domain starts at 0
+    if (kind == 1) return float(clamp(i - degree, 0, count - degree));
+    return float(i - degree);
+}}
+
+void main() {{
+    int curve = texelFetch(instances, base + gl_InstanceID).r;
+    ivec4 info = texelFetch(curves, curve);
+    int first = info.x, count = info.y, degree = info.z, kind = info.w;
+    vec3 point;
+    if (kind == 0) {{
+        float t = float(gl_VertexID) / float(vertices - 1);
+        vec3 q[{MAX_BEZIER_POINTS}];
+        for (int i = 0; i < count; i++) q[i] = texelFetch(controls, first + i).xyz;
+        for (int r = 1; r < count; r++)
+            for (int i = 0; i < count - r; i++) q[i] = mix(q[i], q[i + 1], t);
+        point = q[0];
+    }} else {{
+        int wrapped = kind == 3 ? count + degree : count;
+        int spans = wrapped - degree;
+        float u = float(gl_VertexID) * float(spans) / float(vertices - 1);
+        int span = min(int(u), spans - 1) + degree;
+        vec3 d[{MAX_DEGREE + 1}];
+        for (int r = 0; r <= degree; r++) d[r] = control_point(first, count, span - degree + r);
+        for (int r = 1; r <= degree; r++)
+            // j runs from degree down to r (a loop counting down is miscompiled by Mesa 22's llvmpipe)
+            for (int k = 0; k <= degree - r; k++) {{
+                int j = degree - k, i = j + span - degree;
+                float low = knot(i, degree, wrapped, kind), high = knot(i + degree + 1 - r, degree, wrapped, kind);
+                d[j] = mix(d[j - 1], d[j], (u - low) / (high - low));
+            }}
+        point = d[degree];
+    }}
+    color = texelFetch(colors, curve).rgb;
+    gl_Position = projection * vec4(point.xy / point.z, 0.0, 1.0);
+}}
+"""
+
+FRAGMENT_SHADER = """
+#version 140
+in vec3 color;
+out vec4 fragment;
+
+void main() {
+    fragment = vec4(color, 1.0);
+}
+"""
+
+_program = {}
+
+def curve_program():
+    # Compiled once per GL context and shared by all renderers
+    if 'program' not in _program:
+        _program['program'] = compileProgram(compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
+                                             compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER), validate=False)
+    return _program['program']
+
+def shaders_supported():
+    try:
+        version = glGetString(GL_VERSION)
+        major, minor = version.split()[0].split(b'.')[:2]
+        if (int(major), int(minor)) < (3, 1) or not bool(glDrawArraysInstanced) or not bool(glTexBuffer):
+            return False
+        curve_program()
+    except Exception:
+        return False
+    return True
+
+def samples_per_piece(pieces, density):
+    # As many samples per piece (control polygon leg or B-spline span) as the CPU path gives at
+    # density 1: at least 8, and CURVE_SAMPLES per curve in total
+    per_piece = np.ceil(np.maximum(8.0, (CURVE_SAMPLES - 1) / pieces) * density)
+    return np.clip(per_piece, 1, MAX_SAMPLES_PER_PIECE).astype(np.int64)
+
+def gpu_curve(store, index):
+    # (kind, degree, pieces) of a curve the shader can draw, None for the others
+    first, last = store.control_offsets[index], store.control_offsets[index + 1]
+    count = int(last - first)
+    curve_type = CURVE_TYPES[store.types[index]]
+    if count < 2 or store.bg_colors[index, 3] > 0 or not np.all(store.weights[first:last] > 0):
+        return None
+    if curve_type == 'Bézier' and count <= MAX_BEZIER_POINTS and np.all(store.weights[first:last] == 1.0):
+        return CURVE_KINDS['Bézier'], count - 1, count - 1
+    if curve_type == 'B-spline':
+        degree = max(1, min(int(store.degrees[index]), count - 1))
+        knot_type = KNOT_TYPES[store.knot_types[index]]
+        if degree <= MAX_DEGREE:
+            wrapped = count + degree if knot_type == 'uniform' else count
+            return CURVE_KINDS[knot_type], degree, wrapped - degree
+    return None
+
+class ShaderCurveRenderer:
+    def __init__(self, level=0, capacity=64):
+        self.level = level
+        self.cpu = CurveRenderer(level)
+        self.controls = np.zeros((capacity * 4, 4), dtype=np.float32)  # x * w, y * w, w, 0
+        self.curves = np.zeros((capacity, 4), dtype=np.int32)  # first control point, count, degree, kind
+        self.colors = np.zeros((capacity, 4), dtype=np.float32)
+        self.pieces = np.zeros(capacity, dtype=np.int64)
+        self.bboxes = np.zeros((capacity, 4))
+        self.control_count = 0
+        self.gpu_count = 0
+        self.on_gpu = []  # For every curve in drawing order, whether the shader draws it
+        self.runs = None  # (on GPU, first, last) of every run of curves drawn the same way, by index in its path
+        self.pending = []
+        self.density = 2.0 ** level  # Samples relative to the CPU tessellation
+        self.drawn_count = 0
+        self.textures = None  # (buffer, texture) of controls, curves, colors and instances
+        self.uploaded = False
+
+    @property
+    def curve_count(self):
+        return len(self.on_gpu) + len(self.pending)
+
+    @property
+    def vertex_count(self):
+        # Vertices of the CPU path plus those the shader evaluates per frame
+        pieces = self.pieces[:self.gpu_count]
+        return self.cpu.vertex_count + int(np.sum(pieces * samples_per_piece(pieces, self.density) + 1))
+
+    def append(self, curve):
+        self.pending.append(curve)
+
+    def extend(self, store, first=0):
+        self.flush()
+        for index in range(first, store.count):
+            self._store(store, index)
+
+    def _reserve(self, controls, curves):
+        if self.control_count + controls > len(self.controls):
+            self.controls = np.resize(self.controls, (max(self.control_count + controls, 2 * len(self.controls)), 4))
+        if self.gpu_count + curves > len(self.curves):
+            capacity = max(self.gpu_count + curves, 2 * len(self.curves))
+            self.curves = np.resize(self.curves, (capacity, 4))
+            self.colors = np.resize(self.colors, (capacity, 4))
+            self.pieces = np.resize(self.pieces, capacity)
+            self.bboxes = np.resize(self.bboxes, (capacity, 4))
+
+    def _store(self, store, index):
+        shape = gpu_curve(store, index)
+        self.on_gpu.append(shape is not None)
+        self.runs = None
+        if shape is None:
+            self.cpu.append(store[index])
+            return
+        kind, degree, pieces = shape
+        first, last = store.control_offsets[index], store.control_offsets[index + 1]
+        count = int(last - first)
+        self._reserve(count, 1)
+        weights = store.weights[first:last, None]
+        controls = self.controls[self.control_count:self.control_count + count]
+        controls[:, :2] = store.control_points[first:last] * weights
+        controls[:, 2:3] = weights
+        controls[:, 3] = 0.0
+        self.curves[self.gpu_count] = (self.control_count, count, degree, kind)
+        self.colors[self.gpu_count] = (*store.colors[index], 1.0)
+        self.pieces[self.gpu_count] = pieces
+        self.bboxes[self.gpu_count] = store.bboxes[index]
+        self.control_count += count
+        self.gpu_count += 1
+        self.uploaded = False
+
+    def flush(self):
+        for curve in self.pending:
+            self._store(curve.store, curve.index)
+        self.pending.clear()
+
+    def prepare(self, bounds, deadline):
+        # Only the CPU path tessellates curves when they are first drawn
+        self.flush()
+        return self.cpu.prepare(bounds, deadline)
+
+    def pop(self):
+        if self.pending:
+            self.pending.pop()
+            return
+        if not self.on_gpu:
+            return
+        self.runs = None
+        if self.on_gpu.pop():
+            self.gpu_count -= 1
+            self.control_count = int(self.curves[self.gpu_count, 0])
+            self.uploaded = False
+        else:
+            self.cpu.pop()
+
+    def clear(self):
+        self.pending.clear()
+        self.on_gpu.clear()
+        self.runs = None
+        self.cpu.clear()
+        self.gpu_count = 0
+        self.control_count = 0
+        self.uploaded = False
+
+    def release(self):
+        self.cpu.release()
+        if self.textures is not None:
+            buffers, textures = zip(*self.textures)
+            glDeleteTextures(len(textures), textures)
+            glDeleteBuffers(len(buffers), buffers)
+            self.textures = None
+            self.uploaded = False
+
+    def _upload(self, instances):
+        # The curve tables only when they changed, the list of drawn curves every frame
+        if self.textures is None:
+            buffers = glGenBuffers(4)
+            textures = glGenTextures(4)
+            self.textures = list(zip(buffers, textures))
+        arrays = (self.controls[:max(self.control_count, 1)], self.curves[:max(self.gpu_count, 1)],
+                  self.colors[:max(self.gpu_count, 1)], instances)
+        formats = (GL_RGBA32F, GL_RGBA32I, GL_RGBA32F, GL_R32I)
+        for i, ((buffer, texture), array, internal_format) in enumerate(zip(self.textures, arrays, formats)):
+            if i < 3 and self.uploaded:
+                continue
+            array = np.ascontiguousarray(array)
+            glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+            glBufferData(GL_TEXTURE_BUFFER, array.nbytes, array, GL_DYNAMIC_DRAW)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+            glTexBuffer(GL_TEXTURE_BUFFER, internal_format, buffer)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        self.uploaded = True
+
+    def _runs(self):
+        if self.runs is None:
+            on_gpu = np.array(self.on_gpu, dtype=bool)
+            starts = np.flatnonzero(np.diff(on_gpu, prepend=~on_gpu[:1]))
+            ends = np.append(starts[1:], len(on_gpu))
+            gpu_before = np.concatenate(([0], np.cumsum(on_gpu)))[starts]
+            firsts = np.where(on_gpu[starts], gpu_before, starts - gpu_before)
+            self.runs = list(zip(on_gpu[starts].tolist(), firsts.tolist(), (firsts + ends - starts).tolist()))
+        return self.runs
+
+    def draw(self, bounds=None):
+        self.flush()
+        count = self.gpu_count
+        if bounds is None:
+            shown = np.arange(count)
+        else:
+            left, bottom, right, top = bounds
+            boxes = self.bboxes[:count]
+            shown = np.flatnonzero((boxes[:, 0] <= right) & (boxes[:, 2] >= left) &
+                                   (boxes[:, 1] <= top) & (boxes[:, 3] >= bottom))
+        self.drawn_count = len(shown)
+        runs = self._runs()
+
+        # One instanced draw per run of GPU curves and number of samples
+        gpu_runs = np.array([first for on_gpu, first, _ in runs if on_gpu], dtype=np.int64)
+        run_of = np.searchsorted(gpu_runs, shown, side='right') - 1
+        pieces = self.pieces[shown]
+        vertices = pieces * samples_per_piece(pieces, self.density) + 1
+        order = np.lexsort((vertices, run_of))
+        instances = shown[order].astype(np.int32)
+        vertices, run_of = vertices[order], run_of[order]
+        starts = np.flatnonzero((np.diff(vertices, prepend=-1) != 0) | (np.diff(run_of, prepend=-1) != 0))
+        ends = np.append(starts[1:], len(vertices))
+        if len(shown):
+            self._upload(instances)
+            program = curve_program()
+            glUseProgram(program)
+            # Modelview and projection of the fixed-function pipeline (both column-major)
+            projection = glGetFloatv(GL_MODELVIEW_MATRIX) @ glGetFloatv(GL_PROJECTION_MATRIX)
+            glUniformMatrix4fv(glGetUniformLocation(program, 'projection'), 1, GL_FALSE, projection.astype(np.float32))
+            for unit, name in enumerate(('controls', 'curves', 'colors', 'instances')):
+                glActiveTexture(GL_TEXTURE0 + unit)
+                glBindTexture(GL_TEXTURE_BUFFER, self.textures[unit][1])
+                glUniform1i(glGetUniformLocation(program, name), unit)
+            glActiveTexture(GL_TEXTURE0)
+            base, vertex_location = glGetUniformLocation(program, 'base'), glGetUniformLocation(program, 'vertices')
+            glUseProgram(0)
+
+        gpu_run = 0
+        for on_gpu, first, last in runs:
+            if not on_gpu:
+                self.cpu.draw(bounds, first, last)
+                self.drawn_count += self.cpu.drawn_count
+                continue
+            groups = np.flatnonzero(run_of[starts] == gpu_run)
+            gpu_run += 1
+            if len(groups) == 0:
+                continue
+            glUseProgram(program)
+            for start, end in zip(starts[groups], ends[groups]):
+                glUniform1i(base, int(start))
+                glUniform1i(vertex_location, int(vertices[start]))
+                glDrawArraysInstanced(GL_LINE_STRIP, 0, int(vertices[start]), int(end - start))
+            glUseProgram(0)
+
+        if len(shown):
+            for unit in range(4):
+                glActiveTexture(GL_TEXTURE0 + unit)
+                glBindTexture(GL_TEXTURE_BUFFER, 0)
+            glActiveTexture(GL_TEXTURE0)
@@ -0,0 +1,81 @@
+import numpy as np
+
+# Uniform grid over a list of 2D points, used to pick control points under the mouse.
+# Points are bucketed by cell, so a pick only looks at the few cells around the cursor
+# and stays fast with tens of thousands of points. A radius spanning more cells than are
+# occupied searches all points at once instead. Appending, popping and moving a point
+# update one bucket; rebuild() re-buckets everything in one vectorized pass.
+
+class PointGrid:
+    def __init__(self, cell_size=16.0):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> list of point indices
+        self.points = np.zeros((0, 2))
+        self.count = 0
+        self.version = None  # Version of the point list this index was built from
+
+    def _cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def rebuild(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.points = points.copy()
+        self.count = len(points)
+        self.cells = {}
+        if self.count == 0:
+            return
+        keys = np.floor(points / self.cell_size).astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.any(np.diff(sorted_keys, axis=0) != 0, axis=1)) + 1
+        for group in np.split(order, starts):
+            column, row = keys[group[0]]
+            self.cells[(int(column), int(row))] = group.tolist()
+
+    def _reserve(self, count):
+        if count > len(self.points):
+            self.points = np.resize(self.points, (max(count, 2 * len(self.points), 64), 2))
+
+    def append(self, point):
+        self._reserve(self.count + 1)
+        self.points[self.count] = point
+        self.cells.setdefault(self._cell(*point), []).append(self.count)
+        self.count += 1
+
+    def pop(self):
+        self.count -= 1
+        self._remove(self.count)
+
+    def _remove(self, index):
+        key = self._cell(*self.points[index])
+        bucket = self.cells[key]
+        bucket.remove(index)
+        if not bucket:
+            del self.cells[key]
+
+    def move(self, index, point):
+        self._remove(index)
+        self.points[index] = point
+        self.cells.setdefault(self._cell(*point), []).append(index)
+
+    def nearest(self, x, y, radius):
+        # Index of the closest point within radius of (x, y), or None
+        reach = int(np.ceil(radius / self.cell_size))
+        if (2 * reach + 1) ** 2 > len(self.cells):
+            # The radius covers more cells than are occupied (e.g. zoomed far out): one
+            # vectorized distance pass over the points is cheaper than visiting every cell
+            if self.count == 0:
+                return None
+            distances = np.sum((self.points[:self.count] - (x, y)) ** 2, axis=1)
+            index = int(np.argmin(distances))
+            return index if distances[index] <= radius * radius else None
+        column, row = self._cell(x, y)
+        best, best_distance = None, radius * radius
+        for i in range(column - reach, column + reach + 1):
+            for j in range(row - reach, row + reach + 1):
+                for index in self.cells.get((i, j), ()):
+                    px, py = self.points[index]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= best_distance:
+                        best, best_distance = index, distance
+        return best
@@ -1,121 +1,380 @@
+import time
+startup = {'start': time.perf_counter()}  # Times of the launch phases, reported by --startup-time
+
 import pygame
 import numpy as np
 from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from tkinter import filedialog
 from tkinter.colorchooser import askcolor
-import pandas as pd
 import random
-from PIL import Image, ImageTk
+import argparse
+import json
+import os
+from renderer import CurveRenderer, vbo_supported, draw_fill, lod_samples, visible
+from shader_renderer import ShaderCurveRenderer, shaders_supported
+from curves import CURVE_SAMPLES, tessellate, arc_length_table, prefix_by_length
+from bspline import BSpline, KNOT_TYPES
+from figure_io import write_points, is_binary_figure, open_figure_binary, read_figure_binary, write_figure, iter_points, iter_figure_csv
+from loader import BackgroundLoader
+from scheduler import TessellationScheduler, file_order, start_workers
+from points_view import PointsView
+from spatial import PointGrid
+from profiler import FrameProfiler
+from viewport import Viewport
+from history import Command, History, POINT_BYTES, points_size
+from curve_store import CurveStore, make_curve
+from recorder import SessionRecorder, SessionPlayer
+from icons import load_icon
+from journal import FigureJournal, JOURNAL_DIR, recover
+
+# Command line: sessions can be recorded and replayed as performance tests (see recorder.py)
+parser = argparse.ArgumentParser(description="Bézier and B-spline curve editor")
+session_group = parser.add_mutually_exclusive_group()
+session_group.add_argument('--record', metavar='FILE', help="record the input of this session to FILE")
+session_group.add_argument('--replay', metavar='FILE',
+                           help="replay a recorded session as fast as possible, with hidden windows, and report frame times")
+parser.add_argument('--replay-report', metavar='FILE', help="write the frame-time statistics of the replay to FILE as JSON")
+parser.add_argument('--gpu-curves', action='store_true', help="evaluate Bézier and B-spline curves in shaders (needs OpenGL 3.1)")
+parser.add_argument('--startup-time', action='store_true', help="print how long the launch took, up to the first frame, and exit")
+parser.add_argument('--journal', metavar='DIR', default=JOURNAL_DIR,
+                    help="autosave the figure to a journal in DIR and recover it on the next start (default: %(default)s)")
+parser.add_argument('--no-journal', action='store_true', help="neither recover nor autosave the figure")
+options = parser.parse_args()
+player = SessionPlayer(options.replay) if options.replay else None
+startup['imports'] = time.perf_counter()
+
+def opens_binary_figures(session):
+    return any(name == 'load_figure' and os.path.isfile(args[0]) and is_binary_figure(args[0])
+               for frame in session.frames for name, args in frame['actions'])
+
+# Workers tessellating large figures are forked before pygame and Tk start (see scheduler.py).
+# A timed launch exits before anything is loaded, and a replay may open no binary figure; they
+# don't fork any, and a load uses threads.
+if not options.startup_time and (player is None or opens_binary_figures(player)):
+    start_workers()
+startup['workers'] = time.perf_counter()
 
 # Initial Configuration
 pygame.init()
 width, height = 1080, 720
-screen = pygame.display.set_mode((width, height), pygame.OPENGL | pygame.DOUBLEBUF)
+pygame.display.gl_set_attribute(pygame.GL_STENCIL_SIZE, 8)  # Filled curves are drawn through the stencil buffer
+screen = pygame.display.set_mode((width, height), pygame.OPENGL | pygame.DOUBLEBUF | (pygame.HIDDEN if player else 0))
 pygame.display.set_caption("Spline Curves - Bézier and B-spline")
-gluOrtho2D(0, width, 0, height)
+
+# Pan (middle mouse button) and zoom (mouse wheel) of the canvas, Home resets it
+viewport = Viewport(width, height)
+viewport.apply()
+ZOOM_STEP = 1.25
+
+# Finalized curves live in vertex buffers when the GL context supports them. With GPU curve
+# evaluation (--gpu-curves or the Settings menu) shaders draw Bézier and B-spline curves from
+# their control points instead, if the context has OpenGL 3.1.
+if options.gpu_curves and shaders_supported():
+    curve_renderer = ShaderCurveRenderer()
+else:
+    curve_renderer = CurveRenderer() if vbo_supported() else None
 
 # Font initialization
 pygame.font.init()
 font = pygame.font.SysFont('Helvetica', 18)
+startup['window'] = time.perf_counter()
+
+# Per-stage timings of the main loop, shown by the HUD (F3) and dumped to JSON (F4); a replay keeps every frame
+profiler = FrameProfiler(None if player else 600)
+show_hud = False
+
+# Panel actions by name. Widgets run them through run_action(), so they can be recorded and replayed
+recorder = SessionRecorder(options.record, (width, height)) if options.record else None
+ACTIONS = {}
+
+def run_action(name, *args):
+    if recorder is not None:
+        recorder.action(name, args)
+    return ACTIONS[name](*args)
+
+def action(function):
+    # Command for a widget: runs function as a recorded action, with the widget's arguments
+    ACTIONS[function.__name__] = function
+    return lambda *args: run_action(function.__name__, *args)
+
+def setting(function, variable):
+    # Command for a settings menu entry, recorded with the new value of its variable
+    def apply(value):
+        variable.set(value)
+        function()
+    ACTIONS[function.__name__] = apply
+    return lambda: run_action(function.__name__, variable.get())
+
+def inform(show, title, text):
+    # Message boxes would stop a replay, which prints them instead
+    if player is not None:
+        print(f"{title}: {text}")
+    else:
+        show(title, text)
 
 # Control points and curves
 control_points = []
-curves = []
-    
+curves = CurveStore()  # Finalized curves
+
+# Every change of the scene is appended to the autosave journal (see journal.py), opened at startup
+journal = None
+
+def journal_record(op, **fields):
+    if journal is not None:
+        journal.record(op, **fields)
+
+# The scene is only redrawn when something visible changed (or an animation is playing)
+needs_redraw = True
+
+def request_redraw():
+    global needs_redraw
+    needs_redraw = True
+
 # Current color
 current_color = [1.0, 0.0, 0.0]  # Red by default
 background_color = [0.0, 0.0, 0.0, 0.0]  # Black by default
 
 def draw_points(points):
+    if len(points) == 0:
+        return
     glPointSize(5)
     glColor3f(1.0, 1.0, 1.0)  # White for control points
-    glBegin(GL_POINTS)
-    for point in points:
-        glVertex2f(point[0], point[1])
-    glEnd()
-
-def bezier_curve(points, t):
-    n = len(points) - 1
-    points = np.array(points)
-    p = np.zeros(2)
-    for i in range(n + 1):
-        bernstein = np.math.comb(n, i) * (t**i) * ((1 - t)**(n - i))
-        p += points[i] * bernstein
-    return p
-
-def points_bezier_curve(points, t):
-    p = []
-    for i in range(101):
-        t_i = i / 100.0
-        if t_i <= t:
-            point = bezier_curve(points, t_i)
-            p.append(point)
-    return p
-
-def cubic_spline_interpolation(points, t):
-    points = np.array(points)
-    n = len(points)
-    k = int(t * (n - 1))
-    t_i = t * (n - 1) - k
-    p0 = points[k]
-    p1 = points[(k + 1) % n]
-    p2 = points[(k + 2) % n]
-    p3 = points[(k + 3) % n]
-    
-    a = -0.5 * p0 + 1.5 * p1 - 1.5 * p2 + 0.5 * p3
-    b = p0 - 2.5 * p1 + 2 * p2 - 0.5 * p3
-    c = -0.5 * p0 + 0.5 * p2
-    d = p1
-    
-    return a * (t_i**3) + b * (t_i**2) + c * t_i + d
-
-def points_cubic_spline(points, t):
-    p = []
-    for i in range(101):
-        t_i = i / 100.0
-        if t_i <= t:
-            point = cubic_spline_interpolation(points, t_i)
-            p.append(point)
-    return p
-        
+    draw_vertex_array(GL_POINTS, points)
+
+def draw_vertex_array(primitive, points):
+    if len(points) == 0:
+        return
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, np.ascontiguousarray(points, dtype=np.float32))
+    glDrawArrays(primitive, 0, len(points))
+    glDisableClientState(GL_VERTEX_ARRAY)
+
 def draw_curves(curves):
+    bounds = viewport.bounds()
     for curve in curves:
-        color, points, bg_color = curve['color'], curve['points'], curve.get('bg_color', [0.0, 0.0, 0.0, 0.0])
+        if not visible(curve.bbox, bounds):
+            continue
+        color, points, bg_color = curve.color, lod_samples(curve, lod_level), curve.bg_color
         if bg_color[3] > 0:  # If the background is transparent
-            glColor4f(*bg_color)
-            glBegin(GL_POLYGON)
-            for point in points:
-                glVertex2f(point[0], point[1])
-            glEnd()
+            draw_fill(points, bg_color)
         glColor3f(*color)
-        glBegin(GL_LINE_STRIP)
-        for point in points:
-            glVertex2f(point[0], point[1])
-        glEnd()
+        draw_vertex_array(GL_LINE_STRIP, points)
+
+# Tessellation cache for the curve being edited, invalidated whenever control_points changes
+control_points_version = 0
+tessellation_cache = {'key': None, 'parameters': np.zeros(0), 'points': np.zeros((0, 2)), 'lengths': np.zeros(0)}
+
+# Adaptive tessellation samples each curve until it deviates less than the tolerance (in pixels)
+adaptive = False
+tessellation_tolerance = 0.25
+
+def control_points_changed():
+    global control_points_version
+    control_points_version += 1
+    request_redraw()
+
+# Spatial index over control_points for picking. Single-point edits update it in place;
+# any other change to control_points makes it stale and it is rebuilt on the next pick.
+point_index = PointGrid()
+PICK_RADIUS = 8  # Window pixels, divided by the zoom for world distances
+
+# The control point being moved with the mouse and its position when the drag started. It is
+# let go when the points up to it are replaced or removed, which leaves the index pointing elsewhere.
+drag = {'index': None, 'start': None}
+
+def synced_point_index():
+    if point_index.version != control_points_version:
+        point_index.rebuild(control_points)
+        point_index.version = control_points_version
+    return point_index
+
+# B-spline settings for new curves
+spline_degree = 3
+knot_type = 'clamped'
+
+# In B-spline mode the live curve is a BSpline object. Single-point edits update it locally
+# (only the spans around the edited point are re-evaluated); anything else rebuilds it.
+live_spline = {'spline': None, 'key': None}
+
+def spline_key():
+    return (control_points_version, spline_degree, knot_type, adaptive, tessellation_tolerance)
+
+def append_control_point(point):
+    index_in_sync = point_index.version == control_points_version
+    spline_in_sync = live_spline['key'] == spline_key()
+    control_points.append(point)
+    control_points_changed()
+    journal_record('add_point', point=point)
+    if index_in_sync:
+        point_index.append(point)
+        point_index.version = control_points_version
+    if spline_in_sync:
+        live_spline['spline'].append_point(point)
+        live_spline['key'] = spline_key()
+
+def pop_control_point():
+    index_in_sync = point_index.version == control_points_version
+    spline_in_sync = live_spline['key'] == spline_key() and len(control_points) > 2
+    control_points.pop()
+    drag['index'] = None
+    control_points_changed()
+    journal_record('pop_point')
+    if index_in_sync:
+        point_index.pop()
+        point_index.version = control_points_version
+    if spline_in_sync:
+        live_spline['spline'].pop_point()
+        live_spline['key'] = spline_key()
+
+def move_control_point(index, point):
+    index_in_sync = point_index.version == control_points_version
+    spline_in_sync = live_spline['key'] == spline_key()
+    control_points[index] = point
+    control_points_changed()
+    journal_record('move_point', index=index, point=point)
+    if index_in_sync:
+        point_index.move(index, point)
+        point_index.version = control_points_version
+    if spline_in_sync:
+        live_spline['spline'].move_point(index, point)
+        live_spline['key'] = spline_key()
+
+def tessellate_live_spline(points):
+    if live_spline['key'] != spline_key():
+        tolerance = tessellation_tolerance if adaptive else None
+        live_spline['spline'] = BSpline(points, spline_degree, knot_type, tolerance=tolerance)
+        live_spline['key'] = spline_key()
+    return live_spline['spline'].tessellation()
+
+# Optionally, Bézier curves with more control points than this are drawn (and finalized)
+# as a chain of cubic pieces instead of one curve of very high degree
+split_long_bezier = False
+LONG_BEZIER_POINTS = 32
+
+def current_curve_type(points):
+    if mode == 'Bézier' and split_long_bezier and len(points) > LONG_BEZIER_POINTS:
+        return 'Piecewise cubic'
+    return mode
+
+def tessellate_current_curve(points):
+    curve_type = current_curve_type(points)
+    key = (control_points_version, curve_type, CURVE_SAMPLES, adaptive, tessellation_tolerance, spline_degree, knot_type)
+    if tessellation_cache['key'] != key:
+        if curve_type == 'B-spline' and len(points) > 1:
+            parameters, curve_points = tessellate_live_spline(points)
+        else:
+            parameters, curve_points = tessellate(points, curve_type, adaptive, tessellation_tolerance)
+        tessellation_cache['key'] = key
+        tessellation_cache['parameters'] = parameters
+        tessellation_cache['points'] = curve_points
+        tessellation_cache['lengths'] = arc_length_table(curve_points)
+    return tessellation_cache['points']
+
+def current_tolerance():
+    return tessellation_tolerance if adaptive else None
+
+def draw_finalized_curves():
+    if curve_renderer is not None:
+        curve_renderer.draw(viewport.bounds())
+    else:
+        draw_curves(curves)
+
+def add_curve(curve):
+    curves.attach(curve)
+    request_redraw()
+    if journal is not None:
+        journal.record_curve(curve)
+    if curve_renderer is not None:
+        curve_renderer.append(curve)
+
+def add_curves(store):
+    # Appends every curve of a store (e.g. read from a file) in bulk
+    added = curves.extend(store)
+    request_redraw()
+    if journal is not None:
+        journal.scene_changed()
+    show_curves(added.start)
+    return added
+
+def show_curves(first):
+    # Hands curves first.. to the renderer
+    if curve_renderer is not None:
+        curve_renderer.extend(curves, first)  # At the renderer's level of detail
+
+def pop_curve():
+    curves.pop()
+    request_redraw()
+    journal_record('pop')
+    if curve_renderer is not None:
+        curve_renderer.pop()
+    if lod_build is not None and lod_build['count'] > len(curves):
+        lod_build['renderer'].pop()
+        lod_build['count'] -= 1
+
+# Finalized curves are drawn at the level of detail of the current zoom (see renderer.has_levels).
+# When the level changes, a second renderer is filled with the curves at the new level within a
+# time budget per frame and swapped in once the curves in view are tessellated (the others are
+# when they come into view); until then the previous level is drawn. Only the renderers keep
+# the samples of a level, so the previous level is freed with its renderer.
+lod_level = 0
+lod_build = None  # {'level', 'renderer', 'count' of curves added so far} while a level is built
+LOD_BUILD_SECONDS = 0.008
+
+def cancel_lod_build():
+    global lod_build
+    if lod_build is not None:
+        lod_build['renderer'].release()
+        lod_build = None
+
+def update_level_of_detail():
+    global lod_level, lod_build, curve_renderer
+    level = viewport.lod_level()
+    if curve_renderer is None:
+        # Immediate mode draws each curve at the current level directly
+        lod_level = level
+        return
+    if isinstance(curve_renderer, ShaderCurveRenderer):
+        # The shader evaluates its curves from their control points, only the sample density
+        # changes; a new renderer is only built for the curves it leaves to the CPU
+        curve_renderer.density = 2.0 ** level
+        curve_renderer.flush()
+        if curve_renderer.cpu.curve_count == 0:
+            cancel_lod_build()
+            curve_renderer.level = curve_renderer.cpu.level = lod_level = level
+            return
+    if lod_build is not None and lod_build['level'] != level:
+        cancel_lod_build()
+    if lod_build is None:
+        if level == lod_level:
+            return
+        lod_build = {'level': level, 'renderer': type(curve_renderer)(level), 'count': 0}
+    renderer = lod_build['renderer']
+    deadline = time.perf_counter() + LOD_BUILD_SECONDS
+    while lod_build['count'] < len(curves) and time.perf_counter() < deadline:
+        renderer.append(curves[lod_build['count']])
+        renderer.flush()
+        lod_build['count'] += 1
+    if lod_build['count'] == len(curves) and renderer.prepare(viewport.bounds(), deadline):
+        curve_renderer.release()
+        curve_renderer = renderer
+        lod_level = level
+        lod_build = None
+    request_redraw()
 
 def draw_current_curve(points, t, color, bg_color):
     if len(points) > 1:
-        if mode == 'Bézier':
-            curve_points = points_bezier_curve(points, t)
-        elif mode == 'B-spline':
-            curve_points = points_cubic_spline(points, t)
+        # The animation reveals the part of the cached full curve covering a fraction t of its length
+        with profiler.stage('tessellation'):
+            curve_points = tessellate_current_curve(points)
+        curve_points = prefix_by_length(curve_points, tessellation_cache['lengths'], t)
         if bg_color[3] > 0:  # If the background is transparent
-            glColor4f(*bg_color)
-            glBegin(GL_POLYGON)
-            for point in curve_points:
-                glVertex2f(point[0], point[1])
-            glEnd()
+            # The stencil fill needs no triangulation, so the revealed part is filled as it is
+            draw_fill(curve_points, bg_color)
         glColor3f(*color)
-        glBegin(GL_LINE_STRIP)
-        
-        for point in curve_points:
-            glVertex2f(point[0], point[1])
-        glEnd()
+        draw_vertex_array(GL_LINE_STRIP, curve_points)
 
 # Functions for the current mode
 mode = None
@@ -123,38 +382,76 @@ mode = None
 def set_bezier():
     global mode
     mode = 'Bézier'
+    request_redraw()
+    journal_record('mode', mode=mode)
     label2.config(text="Current mode: " + mode)
     print("Bézier mode selected.")
 
 def set_b_spline():
     global mode
     mode = 'B-spline'
+    request_redraw()
+    journal_record('mode', mode=mode)
     label2.config(text="Current mode: " + mode)
     print("B-spline mode selected.")
 
-def reset():
-    global control_points, curves, mode
-    control_points = []
-    curves = []
-    mode = None
-    label2.config(text="Current mode: " + "None")
+def scene():
+    # The current curve store (shared, not copied: edits after this point are undone
+    # before the scene can be restored), a copy of the control points and the mode
+    return curves, list(control_points), mode
+
+def scene_size(state):
+    state_curves, state_points, _ = state
+    return state_curves.nbytes + points_size(state_points)
+
+def set_scene(state):
+    global curves, mode
+    curves, state_points, mode = state
+    if len(curves) == 0:
+        journal_record('clear')
+    elif journal is not None:
+        journal.scene_changed()
+    journal_record('mode', mode=mode)
+    if curve_renderer is not None:
+        curve_renderer.clear()
+    show_curves(0)
+    cancel_lod_build()
+    request_redraw()
+    set_control_points(state_points)
+    label2.config(text="Current mode: " + ("None" if mode is None else mode))
+
+def set_control_points(points):
+    global control_points
+    points = list(points)
+    # Journaled as the change: how many of the current points are kept, and the points after them
+    keep = next((i for i, (old, new) in enumerate(zip(control_points, points)) if tuple(old) != tuple(new)),
+                min(len(control_points), len(points)))
+    if drag['index'] is not None and drag['index'] >= keep:
+        drag['index'] = None
+    control_points = points
+    control_points_changed()
+    journal_record('points', keep=keep, points=control_points[keep:])
     update_points_listbox()
+
+def reset():
+    cancel_loading()
+    previous = scene()
+    history.execute(Command("Reset", lambda: set_scene((CurveStore(), [], None)), lambda: set_scene(previous),
+                            scene_size(previous)))
     print("Reset completed.")
 
 def warning():
-    messagebox.showwarning("Warning", "Select a drawing mode!")
+    inform(messagebox.showwarning, "Warning", "Select a drawing mode!")
 
 def save_points():
     if not control_points:
-        messagebox.showinfo("Information", "No points to save!")
+        inform(messagebox.showinfo, "Information", "No points to save!")
         return
     file_path = filedialog.asksaveasfilename(defaultextension=".txt",
                                              filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
     if file_path:
-        with open(file_path, 'w') as file:
-            for point in control_points:
-                file.write(f"{point[0]},{point[1]}\n")
-        messagebox.showinfo("Success", "Points saved!")
+        write_points(file_path, control_points)
+        inform(messagebox.showinfo, "Success", "Points saved!")
 
 def load_points():
 
@@ -165,60 +462,153 @@ def load_points():
     file_path = filedialog.askopenfilename(defaultextension=".txt",
                                            filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
     if file_path:
-        with open(file_path, 'r') as file:
-            points = []
-            for line in file:
-                x, y = map(float, line.strip().split(','))
-                points.append([x, y])
-        if points:
-            global control_points
-            control_points = points
+        load_points_command(file_path)
+
+def load_points_file(file_path):
+    cancel_loading()
+    previous = scene()
+    set_control_points([])
+    record_load(file_path, previous)
+    start_loading(BackgroundLoader(iter_points, file_path), 'points')
+
+load_points_command = action(load_points_file)
+
+# Background loading of point files and figures, drained by poll_loader() every frame
+loader = None
+loading_scene = {'loaded': []}  # Curves loaded so far
+loader_kind = None
+LOADER_BATCHES_PER_FRAME = 4
+PARALLEL_MIN_CURVES = 1000  # Binary figures with fewer curves are tessellated right away
+
+def start_loading(new_loader, kind):
+    global loader, loader_kind
+    if loader is not None:
+        loader.cancel()
+    loader = new_loader
+    loader_kind = kind
+    loading_scene['loaded'] = []
+    loading_label.config(text="Loading " + kind + "...")
+    loading_progress_bar["value"] = 0.0
+    loading_frame.pack(before=notebook, fill='x', padx=10, pady=(0, 10))
+
+def cancel_loading(kind=None):
+    # Stops the load right away (only a load of that kind, if one is given), keeping what was
+    # loaded so far. Its history entry was recorded when it started.
+    global loader
+    if loader is not None and kind in (None, loader_kind):
+        loader.cancel()
+        cancelled, loader = loader, None
+        loading_frame.pack_forget()
+        restore_file_order(cancelled)
+        print("Loading cancelled.")
+
+def restore_file_order(finished):
+    # Curves of a parallel load arrive nearest to the view first, the scene keeps them in file
+    # order. They are moved within the store, so their handles keep what is cached with them.
+    loaded, loading_scene['loaded'] = loading_scene['loaded'], []
+    if isinstance(finished, TessellationScheduler) and loaded:
+        curves.reorder(file_order(len(curves), loaded, finished.taken))
+        set_scene(scene())
+
+def poll_loader():
+    global loader
+    if loader is None:
+        return
+    for batch in loader.take(LOADER_BATCHES_PER_FRAME):
+        if loader_kind == 'points':
+            points = batch.tolist()
+            control_points.extend(points)
+            control_points_changed()
+            journal_record('add_points', points=points)
             update_points_listbox()
+        else:
+            added = add_curves(batch)
+            loading_scene['loaded'].extend(curves.handles[added.start:added.stop])
+    loading_progress_bar["value"] = loader.progress
+    if not loader.done:
+        return
+
+    finished, loader = loader, None
+    loading_frame.pack_forget()
+    restore_file_order(finished)
+    if finished.error is not None:
+        inform(messagebox.showerror, "Error", f"Could not load {finished.file_path}: {finished.error}")
+    elif finished.cancelled.is_set():
+        pass
+    elif loader_kind == 'points':
+        if control_points:
             print("Points loaded.")
         else:
-            messagebox.showinfo("Information", "File contains invalid points!")
+            inform(messagebox.showinfo, "Information", "File contains invalid points!")
+    else:
+        inform(messagebox.showinfo, "Success", "Figure loaded!")
 
 def choose_color():
-    global current_color
     color = askcolor()[0]
     if color:
-        current_color = [c / 255.0 for c in color]  # Converting to normalized format for OpenGL
+        set_color_command([c / 255.0 for c in color])  # Converting to normalized format for OpenGL
+
+def set_color(color):
+    global current_color
+    current_color = color
+    request_redraw()
+
+set_color_command = action(set_color)
 
 def choose_background_color():
-    global background_color
     color = askcolor()[1]
     if color:
         bg_color = list(int(color[i:i+2], 16) for i in (1, 3, 5))
         bg_color.append(255)  # Alpha channel
-        background_color = [c / 255.0 for c in bg_color]
+        set_background_color_command([c / 255.0 for c in bg_color])
+
+def set_background_color(color):
+    global background_color
+    background_color = color
+    request_redraw()
+
+set_background_color_command = action(set_background_color)
 
 def update_points_listbox():
-    points_listbox.delete(0, tk.END)
-    for point in control_points:
-        points_listbox.insert(tk.END, f"x={point[0]}, y={point[1]}")
+    # Only the visible rows are touched, so this is cheap to call after every edit
+    points_view.refresh()
 
 def finalize_curve():
-    global background_color
     if len(control_points) > 1 and mode is not None:
-        if mode == 'Bézier':
-            curve_points = points_bezier_curve(control_points, t=1)
-        elif mode == 'B-spline':
-            curve_points = points_cubic_spline(control_points, t=1)
-        curves.append({'points': curve_points, 'color': current_color, 'bg_color': background_color})
-        
-        control_points.clear()
-        update_points_listbox()
-        background_color = [0.0, 0.0, 0.0, 0.0]  # Reset the background color
+        cancel_loading()  # Loaded curves or points are not mixed in with the edit
+        curve_points = tessellate_current_curve(control_points)
+        curve = make_curve(curve_points, current_color, background_color, current_curve_type(control_points), control_points,
+                           current_tolerance(), spline_degree, knot_type)
+        points, bg_color = list(control_points), background_color
+
+        def do():
+            global background_color
+            add_curve(curve)
+            set_control_points([])
+            background_color = [0.0, 0.0, 0.0, 0.0]  # Reset the background color
+
+        def undo():
+            global background_color
+            pop_curve()
+            set_control_points(points)
+            background_color = bg_color
+
+        history.execute(Command("Finalize curve", do, undo, curve.nbytes + points_size(points)))
 
 animate = False
-animation_speed = 0.0009
+animation_speed = 0.054  # Fraction of the curve length drawn per second
 animation_t = 1
+last_animation_time = None  # perf_counter() of the previous animation step, None while stopped
 loop = False
 paused = False
 
+def animation_clock():
+    # Seconds for timing the animation: a replay runs on the recorded time of its input
+    return player.time if player is not None else time.perf_counter()
+
 def animate_curves():
     global animation_t
-    global loop
+    global last_animation_time
     if animate:
         '''
         if len(control_points) < 2:
@@ -227,13 +617,19 @@ def animate_curves():
             return
         '''
 
-        if paused is False:
-            animation_t += animation_speed
+        # Advance by elapsed time (recorded time in a replay), so playback speed does not depend on the frame rate
+        now = animation_clock()
+        if paused is False and last_animation_time is not None:
+            animation_t += animation_speed * (now - last_animation_time)
+        last_animation_time = None if paused else now
         update_animation_progress(animation_t)
 
         if animation_t >= 1.0:
-            if loop is False: animation_t = 1.0
+            if loop is False:
+                animation_t = 1.0
+                last_animation_time = None
             else: animation_t = 0.0
+            request_redraw()  # Draw the final frame before the loop goes idle
             
 def loop_flag():
     global loop
@@ -246,6 +642,7 @@ def loop_flag():
 
 def pause_flag():
     global paused
+    request_redraw()
     if paused is False:
         paused = True
         pause_button.config(text="On")
@@ -256,6 +653,9 @@ def pause_flag():
 def animate_flag():
     global animate
     global animation_t
+    global last_animation_time
+    request_redraw()
+    last_animation_time = None
     if animate is False:
         animation_t = 0
         animate = True
@@ -271,58 +671,123 @@ def animate_flag():
 
 def save_curves_to_csv():
     if len(curves) == 0:
-        messagebox.showwarning("Warning", "No curves finalized!")
+        inform(messagebox.showwarning, "Warning", "No curves finalized!")
         return
 
     file_path = filedialog.asksaveasfilename(defaultextension=".csv",
-                                             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+                                             filetypes=[("CSV files", "*.csv"), ("Spline figures", "*.spf"), ("All files", "*.*")])
     if file_path:
-        data = []
-        for curve in curves:
-            points = ','.join([f"{p[0]} {p[1]}" for p in curve['points']])
-            color = ' '.join(map(str, curve['color']))
-            bg_color = ' '.join(map(str, curve['bg_color']))
-            data.append([mode, points, color, bg_color])
-        df = pd.DataFrame(data, columns=['type', 'points', 'color', 'bg_color'])
-        df.to_csv(file_path, index=False)
-        messagebox.showinfo("Success", "Figure saved!")
+        write_figure(file_path, curves)
+        inform(messagebox.showinfo, "Success", "Figure saved!")
+
+def record_load(file_path, previous):
+    # Recorded when the load starts, so edits made while it runs are undone before it. A load
+    # (even a cancelled one) is undone as a whole, back to the scene before it; undo stops a
+    # running load first, and redo brings back the scene the load was undone from.
+    loaded = {}
+
+    def undo():
+        loaded['scene'] = scene()
+        set_scene(previous)
+
+    # Charged for the scene before the load, which only the history keeps alive
+    history.record(Command("Load " + file_path, lambda: set_scene(loaded['scene']), undo, scene_size(previous)))
 
 def load_curves_from_csv():
     file_path = filedialog.askopenfilename(defaultextension=".csv",
-                                           filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+                                           filetypes=[("CSV files", "*.csv"), ("Spline figures", "*.spf"), ("All files", "*.*")])
     if file_path:
-        reset()
-        df = pd.read_csv(file_path)
-        for _, row in df.iterrows():
-            points = [[float(point.split(' ')[0]), float(point.split(' ')[1])] for point in row['points'].split(',') if len(point.split()) == 2]
-            color = list(map(float, row['color'].split()))
-            bg_color = list(map(float, row['bg_color'].split()))
-            curves.append({'points': points, 'color': color, 'bg_color': bg_color})
-        messagebox.showinfo("Success", "Figure loaded!")
+        load_figure_command(file_path)
+
+def load_figure(file_path):
+    cancel_loading()
+    previous = scene()
+    set_scene((CurveStore(), [], None))
+    record_load(file_path, previous)
+    if is_binary_figure(file_path) and (len(open_figure_binary(file_path)['types']) >= PARALLEL_MIN_CURVES or lod_level != 0):
+        # Large binary figures are tessellated on all cores, visible curves first, and so is any
+        # binary figure while zoomed, which also needs its curves at the level of detail
+        start_loading(TessellationScheduler(file_path, viewport.bounds(), lod_level), 'figure')
+    elif is_binary_figure(file_path):
+        # Binary figures are read in one piece; curves are tessellated when first drawn
+        add_curves(read_figure_binary(file_path, lazy=True))
+        inform(messagebox.showinfo, "Success", "Figure loaded!")
+    else:
+        start_loading(BackgroundLoader(iter_figure_csv, file_path), 'figure')
+
+load_figure_command = action(load_figure)
+
+# Undo/redo history of all edits, bounded by HISTORY_LIMITS (bytes kept alive by old entries)
+HISTORY_LIMITS = (16 * 1024 * 1024, 64 * 1024 * 1024, 256 * 1024 * 1024)
+history = History(HISTORY_LIMITS[1])
 
 def undo():
-    if len(control_points) == 0: 
-        if len(curves) !=0 : curves.pop()
-    else: 
-        control_points.pop()
+    cancel_loading()
+    command = history.undo()
+    if command is not None:
+        print("Undone: " + command.name)
+
+def redo():
+    cancel_loading()
+    command = history.redo()
+    if command is not None:
+        print("Redone: " + command.name)
+
+def add_point(point):
+    cancel_loading('points')  # Not mixed in with the loaded points, or undoing it would pop one of those
+    history.execute(Command("Add point", lambda: (append_control_point(point), update_points_listbox()),
+                            lambda: (pop_control_point(), update_points_listbox()), POINT_BYTES))
+
+def record_point_move(index, start, end):
+    # The drag has already moved the point, only the history entry is added
+    def move(point):
+        move_control_point(index, point)
         update_points_listbox()
+    history.record(Command("Move point", lambda: move(end), lambda: move(start), 2 * POINT_BYTES))
 
-def draw_random_curve():
-    n = random.randint(2, 10)
+def clear_points():
+    if not control_points:
+        return  # Nothing to clear, no history entry
+    cancel_loading('points')
+    previous = list(control_points)
+    history.execute(Command("Clear points", lambda: set_control_points([]), lambda: set_control_points(previous),
+                            points_size(previous)))
 
-    control_points.clear()
-    update_points_listbox()
+def draw_random_curve(seed):
+    # The seed is recorded with the action, so a replayed session draws the same curve
+    rng = random.Random(seed)
+    n = rng.randint(2, 10)
+
+    points = []
 
+    left, bottom, right, top = viewport.bounds()
+    margin = 50 / viewport.zoom
     for _ in range(n):
-        x = random.randint(50, width-50)
-        y = random.randint(50, height-50)
-        control_points.append([x, y])
-        update_points_listbox()
+        x = rng.uniform(left + margin, right - margin)
+        y = rng.uniform(bottom + margin, top - margin)
+        points.append([x, y])
 
-    m = random.randint(0, 1)
+    m = rng.randint(0, 1)
+    random_mode = 'Bézier' if m == 0 else 'B-spline'
 
-    if m == 0: set_bezier()
-    else: set_b_spline()
+    cancel_loading('points')
+    previous_points, previous_mode = list(control_points), mode
+
+    def set_points_and_mode(points, curve_mode):
+        global mode
+        set_control_points(points)
+        if curve_mode == 'Bézier': set_bezier()
+        elif curve_mode == 'B-spline': set_b_spline()
+        else:
+            mode = None
+            label2.config(text="Current mode: None")
+            journal_record('mode', mode=None)
+
+    history.execute(Command("Random curve", lambda: set_points_and_mode(points, random_mode),
+                            lambda: set_points_and_mode(previous_points, previous_mode),
+                            points_size(points) + points_size(previous_points)))
+
+draw_random_curve_command = action(draw_random_curve)
 
 def on_destroy(event):
     if event.widget == root:
@@ -338,6 +803,8 @@ root.title("Control Panel")
 root.geometry("280x875")
 root.configure(bg="#3A3B3C")
 root.protocol("WM_DELETE_WINDOW", do_nothing)
+if player is not None:
+    root.withdraw()  # The panel is driven by the recorded actions
 #root.bind("<Destroy>", on_destroy)
 
 menubar = tk.Menu(root)
@@ -345,15 +812,129 @@ root.config(menu=menubar)
 
 file_menu = tk.Menu(menubar, tearoff=False)
 
-file_menu.add_command(label="Undo", command = undo)
+file_menu.add_command(label="Undo", command = action(undo), accelerator="Ctrl+Z")
+file_menu.add_command(label="Redo", command = action(redo), accelerator="Ctrl+Y")
 file_menu.add_command(label="Save", command = save_curves_to_csv)
 file_menu.add_command(label="Load", command = load_curves_from_csv)
 
 menubar.insert_cascade(0, label="File", menu=file_menu)
 
+def set_adaptive():
+    global adaptive
+    adaptive = adaptive_var.get()
+    request_redraw()
+    print("Adaptive tessellation " + ("enabled." if adaptive else "disabled."))
+
+def set_tolerance():
+    global tessellation_tolerance
+    tessellation_tolerance = tolerance_var.get()
+    request_redraw()
+
+settings_menu = tk.Menu(menubar, tearoff=False)
+tolerance_menu = tk.Menu(settings_menu, tearoff=False)
+
+adaptive_var = tk.BooleanVar(value=adaptive)
+tolerance_var = tk.DoubleVar(value=tessellation_tolerance)
+
+settings_menu.add_checkbutton(label="Adaptive tessellation", variable=adaptive_var, command=setting(set_adaptive, adaptive_var))
+for tolerance in (0.1, 0.25, 0.5, 1.0, 2.0):
+    tolerance_menu.add_radiobutton(label=f"{tolerance} px", value=tolerance, variable=tolerance_var, command=setting(set_tolerance, tolerance_var))
+settings_menu.add_cascade(label="Tolerance", menu=tolerance_menu)
+
+def set_spline_degree():
+    global spline_degree
+    spline_degree = spline_degree_var.get()
+    request_redraw()
+
+def set_knot_type():
+    global knot_type
+    knot_type = knot_type_var.get()
+    request_redraw()
+
+spline_degree_menu = tk.Menu(settings_menu, tearoff=False)
+knot_type_menu = tk.Menu(settings_menu, tearoff=False)
+spline_degree_var = tk.IntVar(value=spline_degree)
+knot_type_var = tk.StringVar(value=knot_type)
+
+for degree in range(1, 6):
+    spline_degree_menu.add_radiobutton(label=str(degree), value=degree, variable=spline_degree_var, command=setting(set_spline_degree, spline_degree_var))
+for name in KNOT_TYPES:
+    knot_type_menu.add_radiobutton(label=name.capitalize(), value=name, variable=knot_type_var, command=setting(set_knot_type, knot_type_var))
+settings_menu.add_cascade(label="B-spline degree", menu=spline_degree_menu)
+settings_menu.add_cascade(label="Knot vector", menu=knot_type_menu)
+
+def set_frame_cap():
+    global max_fps
+    max_fps = frame_cap_var.get()
+
+def set_low_power():
+    global low_power
+    low_power = low_power_var.get()
+
+frame_cap_menu = tk.Menu(settings_menu, tearoff=False)
+frame_cap_var = tk.IntVar(value=60)
+low_power_var = tk.BooleanVar(value=False)
+
+for fps, label in ((30, "30 FPS"), (60, "60 FPS"), (120, "120 FPS"), (0, "Unlimited")):
+    frame_cap_menu.add_radiobutton(label=label, value=fps, variable=frame_cap_var, command=setting(set_frame_cap, frame_cap_var))
+settings_menu.add_cascade(label="Frame cap", menu=frame_cap_menu)
+settings_menu.add_checkbutton(label="Low-power mode", variable=low_power_var, command=setting(set_low_power, low_power_var))
+
+def set_split_long_bezier():
+    global split_long_bezier
+    split_long_bezier = split_long_bezier_var.get()
+    request_redraw()
+
+split_long_bezier_var = tk.BooleanVar(value=split_long_bezier)
+settings_menu.add_checkbutton(label=f"Split Bézier curves over {LONG_BEZIER_POINTS} points", variable=split_long_bezier_var,
+                              command=setting(set_split_long_bezier, split_long_bezier_var))
+
+def set_gpu_curves():
+    global curve_renderer, lod_level
+    enabled = gpu_curves_var.get()
+    if enabled and not shaders_supported():
+        gpu_curves_var.set(False)
+        inform(messagebox.showwarning, "Warning", "GPU curve evaluation needs OpenGL 3.1, curves are drawn by the CPU.")
+        return
+    cancel_lod_build()
+    if curve_renderer is not None:
+        curve_renderer.release()
+    if enabled:
+        curve_renderer = ShaderCurveRenderer()
+    else:
+        curve_renderer = CurveRenderer() if vbo_supported() else None
+    lod_level = 0  # The new renderer starts from the curves as finalized
+    show_curves(0)
+    request_redraw()
+
+gpu_curves_var = tk.BooleanVar(value=isinstance(curve_renderer, ShaderCurveRenderer))
+settings_menu.add_checkbutton(label="GPU curve evaluation", variable=gpu_curves_var, command=setting(set_gpu_curves, gpu_curves_var))
+
+def set_history_limit():
+    history.set_limit(history_limit_var.get())
+
+history_limit_menu = tk.Menu(settings_menu, tearoff=False)
+history_limit_var = tk.IntVar(value=history.max_bytes)
+
+for limit in HISTORY_LIMITS:
+    history_limit_menu.add_radiobutton(label=f"{limit // (1024 * 1024)} MB", value=limit, variable=history_limit_var, command=setting(set_history_limit, history_limit_var))
+settings_menu.add_cascade(label="Undo memory", menu=history_limit_menu)
+
+menubar.add_cascade(label="Settings", menu=settings_menu)
+
 label2 = tk.Label(root, text="Current Mode: " + ("None" if mode is None else mode), fg="#C4FE00", bg="#3A3B3C", font=("Helvetica", 18, "bold"))
 label2.pack(pady=20)
 
+# Shown above the notebook only while a file loads in the background
+loading_frame = tk.Frame(root, bg="#3A3B3C")
+loading_label = tk.Label(loading_frame, text="Loading...", fg="#FFA201", bg="#3A3B3C", font=("Helvetica", 12, "bold"))
+loading_label.pack(side=tk.LEFT)
+loading_progress_bar = ttk.Progressbar(loading_frame, orient="horizontal", length=110, mode="determinate")
+loading_progress_bar["maximum"] = 1.0
+loading_progress_bar.pack(side=tk.LEFT, padx=5)
+loading_cancel_button = ttk.Button(loading_frame, text="Cancel", command=action(cancel_loading), width=7)
+loading_cancel_button.pack(side=tk.LEFT)
+
 style_frame = ttk.Style()
 style_frame.theme_use('alt')
 style_frame.configure("new.TFrame", background="#000000")
@@ -427,11 +1008,8 @@ style.map('TButton11.TButton',
           foreground=[('active', 'white')])
 
 def photo(path, dim=(30, 30)):
-    image_path = path  
-    image = Image.open(image_path)
-    image = image.resize(dim, Image.LANCZOS) 
-    photo = ImageTk.PhotoImage(image)
-    return photo
+    # Resized icons are cached on disk, see icons.py
+    return load_icon(path, dim)
 
 photo_reset = photo("reset_image.png")
 photo_color_line = photo("color_line_image.jpeg")
@@ -446,10 +1024,10 @@ photo_playback = photo("playback_image.jpeg", dim=(75, 75))
 photo_playback_color = photo("playback_color_image.jpeg", dim=(75, 75))
 photo_reset_animation = photo("reset_image1.png", dim=(30, 20))
 
-bezier_button = ttk.Button(main_frame, text="Bézier", command=set_bezier, style="TButton2.TButton")
+bezier_button = ttk.Button(main_frame, text="Bézier", command=action(set_bezier), style="TButton2.TButton")
 bezier_button.pack(pady=10)
 
-b_spline_button = ttk.Button(main_frame, text="B-spline", command=set_b_spline, style="TButton2.TButton")
+b_spline_button = ttk.Button(main_frame, text="B-spline", command=action(set_b_spline), style="TButton2.TButton")
 b_spline_button.pack(pady=10)
 
 color_button = ttk.Button(main_frame, text="Curve Color", image=photo_color_line, compound=tk.RIGHT, command=choose_color, style="TButton3.TButton")
@@ -458,19 +1036,19 @@ color_button.pack(pady=10)
 background_button = ttk.Button(main_frame, text="Background Color", image=photo_color_bg, compound=tk.RIGHT, command=choose_background_color, style="TButton3.TButton")
 background_button.pack(pady=10)
 
-animation_button = ttk.Button(main_frame, text="Animate mode: Off", image=photo_animate, compound=tk.RIGHT, command=animate_flag, style="TButton7.TButton")
+animation_button = ttk.Button(main_frame, text="Animate mode: Off", image=photo_animate, compound=tk.RIGHT, command=action(animate_flag), style="TButton7.TButton")
 animation_button.pack(pady=10)
 
-finalize_button = ttk.Button(main_frame, text="Finalize Curve", image=photo_finalize_curve, compound=tk.RIGHT, command=finalize_curve, style="TButton8.TButton")
+finalize_button = ttk.Button(main_frame, text="Finalize Curve", image=photo_finalize_curve, compound=tk.RIGHT, command=action(finalize_curve), style="TButton8.TButton")
 finalize_button.pack(pady=10)
 
-draw_random_curve_button = ttk.Button(main_frame, text="Random Curve", image=photo_random_curve, compound=tk.RIGHT, command=draw_random_curve, style="TButton9.TButton")
+draw_random_curve_button = ttk.Button(main_frame, text="Random Curve", image=photo_random_curve, compound=tk.RIGHT, command=lambda: draw_random_curve_command(random.randrange(2 ** 32)), style="TButton9.TButton")
 draw_random_curve_button.pack(pady=10)
 
-undo_last_curve_button = ttk.Button(main_frame, text="Undo", image=photo_undo, compound=tk.RIGHT, command=undo, style="TButton6.TButton")
+undo_last_curve_button = ttk.Button(main_frame, text="Undo", image=photo_undo, compound=tk.RIGHT, command=action(undo), style="TButton6.TButton")
 undo_last_curve_button.pack(pady=10)
 
-reset_button = ttk.Button(main_frame, text="Reset", image=photo_reset, compound=tk.RIGHT, command=reset, style="TButton6.TButton")
+reset_button = ttk.Button(main_frame, text="Reset", image=photo_reset, compound=tk.RIGHT, command=action(reset), style="TButton6.TButton")
 reset_button.pack(pady=10)
 
 save_button = ttk.Button(main_frame, text="Save Points", image=photo_save, compound=tk.RIGHT, command=save_points, style="TButton4.TButton")
@@ -488,8 +1066,8 @@ load_curves_button.pack(pady=10)
 label_developed_by = tk.Label(main_frame, text="Developed by Andrei, George, Nicolas", bg="#3e4149", fg="#ffffff")
 label_developed_by.pack(side=tk.BOTTOM, pady=(20, 10))
 
-points_listbox = tk.Listbox(points_frame, bg="#000000", fg="#FE00FA", font=("Helvetica", 16, "bold"))
-points_listbox.pack(expand=True, fill='both')
+points_view = PointsView(points_frame, lambda: control_points, bg="#000000", fg="#FE00FA", font=("Helvetica", 16, "bold"))
+points_view.pack(expand=True, fill='both')
 
 style = ttk.Style()
 style.theme_use('alt')
@@ -516,18 +1094,24 @@ def update_animation_progress(value):
 def on_click(event):
     if event.widget == animate_progress_bar and animate is True:
         click_x = event.x
-        global animation_t
-        animation_t = click_x / animate_progress_bar.winfo_width()
+        seek_animation_command(click_x / animate_progress_bar.winfo_width())
+
+def seek_animation(t):
+    global animation_t
+    animation_t = t
+    request_redraw()
+
+seek_animation_command = action(seek_animation)
 
 animate_progress_bar.bind("<Button-1>", on_click)
 animate_progress_bar.bind("<B1-Motion>", on_click)
 
 def speed_modified(speed):
     global animation_speed
-    animation_speed = int(speed) / 10000
+    animation_speed = int(speed) / 10000 * 60  # Same speed as the former per-frame step at 60 FPS
 
 scale = tk.Scale(animate_frame, from_=1, to=200, orient="horizontal", background="#FF019F", foreground = "#01FF01",troughcolor='green',
-                 highlightbackground='lightblue', sliderrelief=tk.RAISED, command=speed_modified)
+                 highlightbackground='lightblue', sliderrelief=tk.RAISED, command=action(speed_modified))
 scale.grid(row=1, column=1, padx=10, pady=20, sticky="ew")
 scale.set(50)
 speed_modified(50)
@@ -535,19 +1119,19 @@ speed_modified(50)
 animate_label = tk.Label(animate_frame, text="Mode", fg="#FF00F3", bg="#080B2D", font=("Helvetica", 16, "bold"))
 animate_label.grid(row=2, column=0, padx=5, pady=20, sticky="w")
 
-animation_button2 = ttk.Button(animate_frame, text="Off", command=animate_flag, style="TButton10.TButton")
+animation_button2 = ttk.Button(animate_frame, text="Off", command=action(animate_flag), style="TButton10.TButton")
 animation_button2.grid(row=2, column=1, padx=10, pady=20, sticky="ew")
 
 loop_label = tk.Label(animate_frame, text="Loop", fg="#FBFF01", bg="#080B2D", font=("Helvetica", 16, "bold"))
 loop_label.grid(row=3, column=0, padx=5, pady=20, sticky="w")
 
-loop_button = ttk.Button(animate_frame, text="Off", command=loop_flag, style="TButton11.TButton")
+loop_button = ttk.Button(animate_frame, text="Off", command=action(loop_flag), style="TButton11.TButton")
 loop_button.grid(row=3, column=1, padx=10, pady=20, sticky="ew")
 
 pause_label = tk.Label(animate_frame, text="Pause", fg="#FBFF01", bg="#080B2D", font=("Helvetica", 16, "bold"))
 pause_label.grid(row=4, column=0, padx=5, pady=20, sticky="w")
 
-pause_button = ttk.Button(animate_frame, text="Off", command=pause_flag, style="TButton11.TButton")
+pause_button = ttk.Button(animate_frame, text="Off", command=action(pause_flag), style="TButton11.TButton")
 pause_button.grid(row=4, column=1, padx=10, pady=20, sticky="ew")
 
 reset_label = tk.Label(animate_frame, text="Reset", fg="#FBFF01", bg="#080B2D", font=("Helvetica", 16, "bold"))
@@ -557,8 +1141,9 @@ def reset_animation():
     global animation_t
     animation_t = 0
     update_animation_progress(animation_t)
+    request_redraw()
 
-reset_button2 = ttk.Button(animate_frame, image=photo_reset_animation, command = reset_animation, style="TButton11.TButton")
+reset_button2 = ttk.Button(animate_frame, image=photo_reset_animation, command = action(reset_animation), style="TButton11.TButton")
 reset_button2.grid(row=5, column=1, padx=10, pady=20, sticky="ew")
 
 animate_image1 = tk.Label(animate_frame, image = photo_playback)
@@ -567,47 +1152,267 @@ animate_image1.grid(row=6, column=0, padx=5, pady=20)
 animate_image2 = tk.Label(animate_frame, image = photo_playback_color)
 animate_image2.grid(row=6, column=1, padx=5, pady=20)
 
+startup['panel'] = time.perf_counter()
+
+def open_journal():
+    # Recovers the figure of the last session and journals this one (not a replayed one)
+    global journal
+    if options.no_journal or player is not None:
+        return
+    opened = None
+    try:
+        opened = FigureJournal(options.journal)
+        recovered = recover(options.journal)
+        if recovered is not None:
+            set_scene(recovered)
+            print(f"Recovered {len(curves)} curves and {len(control_points)} points from {options.journal}")
+        opened.compact(*scene())
+    except (OSError, ValueError, LookupError) as error:
+        # An unreadable journal is left as it is
+        print(f"Autosave disabled: {error}")
+        if opened is not None:
+            opened.close()
+        return
+    journal = opened
+
+open_journal()
+startup['recovery'] = time.perf_counter()
+
 # Mainloop for Pygame and Tkinter
 running = True
 clock = pygame.time.Clock()
 
+max_fps = 60  # 0 means no frame cap
+low_power = False
+# While idle the loop blocks on pygame events for this long before pumping Tk again
+IDLE_TIMEOUT_MS = 30
+LOW_POWER_TIMEOUT_MS = 150
+
+# Window events after which the pygame window contents must be drawn again
+REDRAW_EVENTS = {pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWSHOWN,
+                 pygame.WINDOWRESTORED, pygame.WINDOWMAXIMIZED, pygame.WINDOWSIZECHANGED}
+
+def is_active():
+    # Frames are produced continuously while an animation plays or a file is loading
+    playing = animate is True and paused is False and (loop is True or animation_t < 1.0)
+    return playing or loader is not None or lod_build is not None
+
+def next_events():
+    if needs_redraw or is_active():
+        return pygame.event.get()
+    event = pygame.event.wait(LOW_POWER_TIMEOUT_MS if low_power else IDLE_TIMEOUT_MS)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+# On-screen HUD with the profiler statistics, re-rendered a few times per second
+HUD_REFRESH_SECONDS = 0.25
+hud = {'time': 0.0, 'size': (0, 0), 'pixels': None}
+
+def hud_lines():
+    summary = profiler.summary()
+    if summary['frames'] == 0:
+        return ["Waiting for frames..."]
+    frame_ms = summary['frame_ms']
+    stage_ms = summary['stage_ms']
+    counters = summary['counters']
+    stages = "  ".join(f"{name} {stage_ms[name]['mean']:.2f}" for name in
+                       ('events', 'tessellation', 'draw_curves', 'draw_current_curve', 'flip', 'tk_update')
+                       if name in stage_ms)
+    return [
+        f"FPS {summary['fps']:.1f}   frame p50 {frame_ms['p50']:.2f}  p95 {frame_ms['p95']:.2f}  p99 {frame_ms['p99']:.2f} ms",
+        f"Curves {counters.get('curves', 0)} ({counters.get('drawn_curves', '-')} drawn)   vertices {counters.get('vertices', 0)}   control points {counters.get('control_points', 0)}",
+        f"ms: {stages}",
+    ]
+
+def draw_hud():
+    now = time.perf_counter()
+    if hud['pixels'] is None or now - hud['time'] >= HUD_REFRESH_SECONDS:
+        lines = [font.render(line, True, (255, 255, 255)) for line in hud_lines()]
+        surface = pygame.Surface((max(line.get_width() for line in lines) + 12,
+                                  sum(line.get_height() for line in lines) + 8), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        y = 4
+        for line in lines:
+            surface.blit(line, (6, y))
+            y += line.get_height()
+        hud['time'] = now
+        hud['size'] = surface.get_size()
+        hud['pixels'] = pygame.image.tostring(surface, 'RGBA', True)  # Flipped, GL rows go bottom-up
+    hud_width, hud_height = hud['size']
+    glEnable(GL_BLEND)
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    glWindowPos2i(8, height - 8 - hud_height)
+    glDrawPixels(hud_width, hud_height, GL_RGBA, GL_UNSIGNED_BYTE, hud['pixels'])
+    glDisable(GL_BLEND)
+
+def toggle_hud():
+    global show_hud
+    show_hud = not show_hud
+    hud['pixels'] = None
+    request_redraw()
+
+def dump_frame_trace():
+    file_path = time.strftime("frame_trace_%Y%m%d_%H%M%S.json")
+    profiler.dump(file_path)
+    print("Frame trace saved to " + file_path)
+
+def count_vertices():
+    vertices = curve_renderer.vertex_count if curve_renderer is not None else curves.vertex_count
+    return vertices + len(tessellation_cache['points'])
+
+def replay_frame():
+    # Live window events are dropped, the recorded input of the next iteration is used instead
+    pygame.event.clear()
+    frame = player.next_frame(loader is not None)
+    return frame if frame is not None else {'events': [], 'actions': []}
+
+def report_startup():
+    # From the first line of this script, so the interpreter's own start-up is not included
+    # (python -X importtime test.py breaks the imports down further)
+    previous = startup['start']
+    for name in ('imports', 'workers', 'window', 'panel', 'recovery', 'first_frame'):
+        print(f"{name:12} {(startup[name] - previous) * 1000:8.1f} ms")
+        previous = startup[name]
+    print(f"{'total':12} {(startup['first_frame'] - startup['start']) * 1000:8.1f} ms")
+
+def report_replay():
+    summary = profiler.summary()
+    summary['session'] = {'file': player.file_path, 'recorded_seconds': player.duration,
+                          'iterations': len(player.frames)}
+    if summary['frames']:
+        frame_ms = summary['frame_ms']
+        print(f"Replayed {player.file_path}: {summary['frames']} frames, {summary['fps']:.1f} FPS, frame p50 "
+              f"{frame_ms['p50']:.2f}  p95 {frame_ms['p95']:.2f}  p99 {frame_ms['p99']:.2f}  max {frame_ms['max']:.2f} ms")
+    if options.replay_report:
+        with open(options.replay_report, 'w') as file:
+            json.dump(summary, file, indent=2)
+
 def mainloop():
-    global running
+    global running, needs_redraw
+    panning = False
     while running:
-        pygame.init()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if mode is None:
-                    warning()
-                else:
-                    x, y = event.pos
-                    y = height - y  # OpenGL has its origin at the bottom-left corner
-                    control_points.append([x, y])
-                    update_points_listbox()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_c:
-                    control_points.clear()
+        if player is not None:
+            frame = replay_frame()
+            events = frame['events']
+        else:
+            events = next_events()  # Time spent blocked here while idle is not part of the frame
+        if recorder is not None:
+            recorder.events(events)
+        profiler.begin_frame()
+        with profiler.stage('loader'):
+            poll_loader()
+        if journal is not None and loader is None and journal.due:
+            with profiler.stage('autosave'):
+                journal.compact(*scene())
+        with profiler.stage('events'):
+            for event in events:
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type in REDRAW_EVENTS:
+                    request_redraw()
+                elif event.type == pygame.MOUSEWHEEL:
+                    # Replayed wheel events carry the recorded mouse position
+                    viewport.zoom_at(*getattr(event, 'pos', pygame.mouse.get_pos()), ZOOM_STEP ** event.y)
+                    request_redraw()
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 2:
+                    panning = True
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5):
+                    pass  # Wheel steps, handled as MOUSEWHEEL events
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    x, y = viewport.screen_to_world(*event.pos)
+                    picked = None
+                    if event.button == 1:
+                        picked = synced_point_index().nearest(x, y, PICK_RADIUS / viewport.zoom)
+                    if picked is not None:
+                        drag['index'], drag['start'] = picked, list(control_points[picked])
+                    elif mode is None:
+                        warning()
+                    else:
+                        add_point([x, y])
+                elif event.type == pygame.MOUSEMOTION and panning:
+                    viewport.pan(*event.rel)
+                    request_redraw()
+                elif event.type == pygame.MOUSEMOTION and drag['index'] is not None:
+                    move_control_point(drag['index'], viewport.screen_to_world(*event.pos))
                     update_points_listbox()
-
-        keys = pygame.key.get_pressed()
-
-        if keys[pygame.K_z] and keys[pygame.K_LCTRL]:
-            undo()
-
-        glClear(GL_COLOR_BUFFER_BIT)
-        draw_points(control_points)
-        draw_curves(curves)
-        draw_current_curve(control_points, animation_t, current_color, background_color)
-
-        if animate is True: animate_curves()
-        
-        pygame.display.flip()
-        clock.tick(60)
-        root.update_idletasks()
-        root.update()
-
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                    index = drag['index']
+                    if index is not None and list(control_points[index]) != drag['start']:
+                        record_point_move(index, drag['start'], list(control_points[index]))
+                    drag['index'] = None
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 2:
+                    panning = False
+                elif event.type == pygame.KEYDOWN:
+                    ctrl = event.mod & pygame.KMOD_CTRL
+                    if ctrl and (event.key == pygame.K_y or (event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT)):
+                        drag['index'] = None
+                        redo()
+                    elif ctrl and event.key == pygame.K_z:
+                        drag['index'] = None
+                        undo()
+                    elif event.key == pygame.K_c:
+                        clear_points()
+                    elif event.key == pygame.K_HOME:
+                        viewport.reset()
+                        request_redraw()
+                    elif event.key == pygame.K_F3:
+                        toggle_hud()
+                    elif event.key == pygame.K_F4:
+                        dump_frame_trace()
+
+        with profiler.stage('level_of_detail'):
+            update_level_of_detail()
+
+        drawn = needs_redraw or is_active()
+        if drawn:
+            needs_redraw = False
+            viewport.apply()
+            glClear(GL_COLOR_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
+            draw_points(control_points)
+            with profiler.stage('draw_curves'):
+                draw_finalized_curves()
+            with profiler.stage('draw_current_curve'):  # Includes the tessellation stage
+                draw_current_curve(control_points, animation_t, current_color, background_color)
+
+            if animate is True: animate_curves()
+
+            profiler.count('curves', len(curves))
+            if curve_renderer is not None:
+                profiler.count('drawn_curves', curve_renderer.drawn_count)
+            profiler.count('control_points', len(control_points))
+            profiler.count('vertices', count_vertices())
+            if show_hud:
+                draw_hud()
+
+            with profiler.stage('flip'):
+                pygame.display.flip()
+        with profiler.stage('tk_update'):
+            root.update_idletasks()
+            root.update()
+            if player is not None:
+                for name, action_args in frame['actions']:
+                    run_action(name, *action_args)
+        profiler.end_frame(drawn)
+        if drawn and 'first_frame' not in startup:
+            startup['first_frame'] = time.perf_counter()
+            if options.startup_time:
+                report_startup()
+                running = False
+        if recorder is not None:
+            recorder.end_frame(loader is not None)
+        if player is not None and player.done and loader is None and lod_build is None:
+            # A playing animation doesn't keep the replay going
+            running = False
+        elif drawn and player is None:
+            clock.tick(max_fps)
+
+    if recorder is not None:
+        recorder.close()
+    if journal is not None:
+        journal.close()
+    if player is not None:
+        report_replay()
     root.destroy()
     pygame.quit()
 
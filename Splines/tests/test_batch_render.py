@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from batch_render import output_names
+
+def test_output_names_are_relative_to_the_common_directory(tmp_path):
+    figures = [str(tmp_path / 'a' / 'fig.csv'), str(tmp_path / 'a' / 'fig.spf'), str(tmp_path / 'b' / 'fig.csv')]
+    names = output_names(figures)
+    assert names == {figures[0]: os.path.join('a', 'fig.csv'), figures[1]: os.path.join('a', 'fig.spf'),
+                     figures[2]: os.path.join('b', 'fig.csv')}
+
+def test_figures_of_one_directory_keep_their_file_names(tmp_path):
+    figures = [str(tmp_path / 'fig.csv'), str(tmp_path / 'fig.spf')]
+    assert output_names(figures) == {figures[0]: 'fig.csv', figures[1]: 'fig.spf'}
+
+def test_unique_paths_get_unique_names(tmp_path):
+    figures = [str(tmp_path / 'x' / 'y' / 'f.csv'), str(tmp_path / 'x' / 'f.csv'), 'relative/f.csv',
+               os.path.join(os.getcwd(), 'relative', 'f.spf')]
+    names = output_names(figures)
+    assert len(set(names.values())) == len(figures)
+
+def test_no_figures():
+    assert output_names([]) == {}
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from bspline import KNOT_TYPES, BSpline
+
+def random_polygon(count, seed=0):
+    return np.random.default_rng(seed).uniform(0.0, 500.0, (count, 2))
+
+def assert_same_tessellation(spline, fresh):
+    parameters, points = spline.tessellation()
+    fresh_parameters, fresh_points = fresh.tessellation()
+    np.testing.assert_allclose(parameters, fresh_parameters, atol=1e-12)
+    np.testing.assert_allclose(points, fresh_points, atol=1e-9)
+
+@pytest.mark.parametrize('knot_type', KNOT_TYPES)
+@pytest.mark.parametrize('degree', [1, 2, 3, 5])
+@pytest.mark.parametrize('tolerance', [None, 0.5])
+def test_move_point_matches_full_evaluation(knot_type, degree, tolerance):
+    points = random_polygon(12)
+    weights = np.random.default_rng(1).uniform(0.5, 2.0, len(points))
+    spline = BSpline(points, degree, knot_type, weights, tolerance)
+    rng = np.random.default_rng(2)
+    for index in (0, 5, len(points) - 1):
+        points[index] = rng.uniform(0.0, 500.0, 2)
+        weights[index] = rng.uniform(0.5, 2.0)
+        spline.move_point(index, points[index], weights[index])
+        assert_same_tessellation(spline, BSpline(points, degree, knot_type, weights, tolerance))
+
+@pytest.mark.parametrize('knot_type', KNOT_TYPES)
+def test_move_point_only_reevaluates_local_support(knot_type):
+    spline = BSpline(random_polygon(40), 3, knot_type)
+    before = dict(spline.segments)
+    spline.move_point(20, (250.0, 250.0))
+    changed = [span for span in spline.spans if spline.segments[span] is not before[span]]
+    assert changed == spline.affected_spans(20)
+    assert len(changed) == 4
+
+@pytest.mark.parametrize('knot_type', KNOT_TYPES)
+@pytest.mark.parametrize('weighted', [False, True])
+def test_append_and_pop_match_full_evaluation(knot_type, weighted):
+    points = random_polygon(10)
+    weights = np.linspace(0.5, 2.0, len(points)) if weighted else None
+    spline = BSpline(points[:2], 3, knot_type, None if weights is None else weights[:2])
+    for count in range(3, len(points) + 1):
+        spline.append_point(points[count - 1], None if weights is None else weights[count - 1])
+        assert_same_tessellation(spline, BSpline(points[:count], 3, knot_type, None if weights is None else weights[:count]))
+    for count in range(len(points) - 1, 1, -1):
+        spline.pop_point()
+        assert_same_tessellation(spline, BSpline(points[:count], 3, knot_type, None if weights is None else weights[:count]))
+
+def test_clamped_curve_ends_on_the_end_points():
+    points = random_polygon(8)
+    _, samples = BSpline(points, 3, 'clamped').tessellation()
+    np.testing.assert_allclose(samples[[0, -1]], points[[0, -1]], atol=1e-9)
+
+def test_uniform_curve_is_closed():
+    _, samples = BSpline(random_polygon(8), 3, 'uniform').tessellation()
+    np.testing.assert_allclose(samples[0], samples[-1], atol=1e-9)
+
+@pytest.mark.parametrize('knot_type', KNOT_TYPES)
+def test_evaluate_matches_tessellation(knot_type):
+    spline = BSpline(random_polygon(9), 3, knot_type, np.linspace(1.0, 3.0, 9))
+    parameters, samples = spline.tessellation()
+    np.testing.assert_allclose(spline.evaluate(parameters), samples, atol=1e-9)
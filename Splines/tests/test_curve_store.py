@@ -0,0 +1,52 @@
+import numpy as np
+
+from curve_store import CurveStore
+
+def sample_store(count=6):
+    rng = np.random.default_rng(0)
+    store = CurveStore()
+    for i in range(count):
+        control_points = rng.uniform(0.0, 100.0, (i + 2, 2))
+        store.append(rng.uniform(0.0, 100.0, (i + 3, 2)), rng.uniform(0.0, 1.0, 3), (0.0, 0.0, 0.0, 0.0),
+                     'Bézier', control_points, weights=np.linspace(1.0, 2.0, i + 2))
+    return store
+
+def snapshot(curve):
+    return curve.points.copy(), curve.control_points.copy(), curve.weights.copy(), curve.color.copy(), curve.bbox.copy()
+
+def assert_unchanged(curve, before):
+    for value, expected in zip(snapshot(curve), before):
+        np.testing.assert_array_equal(value, expected)
+
+def test_popped_curve_keeps_its_data_and_can_be_appended_again():
+    store = sample_store()
+    last = store[len(store) - 1]
+    before = snapshot(last)
+    popped = store.pop()
+    assert popped is last and len(store) == 5
+    assert_unchanged(popped, before)
+    store.attach(popped)
+    assert store[5] is popped
+    assert_unchanged(popped, before)
+
+def test_extend_moves_the_handles():
+    store, other = sample_store(3), sample_store(4)
+    handles = list(other)
+    before = [snapshot(curve) for curve in handles]
+    added = store.extend(other)
+    assert list(added) == [3, 4, 5, 6] and len(other) == 0
+    for index, curve, expected in zip(added, handles, before):
+        assert store[index] is curve
+        assert_unchanged(curve, expected)
+
+def test_reorder_moves_curves_with_their_handles():
+    store = sample_store()
+    handles = list(store)
+    before = [snapshot(curve) for curve in handles]
+    handles[2].cached('lod', lambda: (1, np.zeros((2, 2))))
+    order = [3, 0, 5, 1, 2, 4]
+    store.reorder(order)
+    for position, index in enumerate(order):
+        assert store[position] is handles[index]
+        assert_unchanged(handles[index], before[index])
+    assert handles[2].cache['lod'][0] == 1
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from curves import (STABLE_BERNSTEIN_DEGREE, bezier_curve_batch, bezier_curves_batch, chord_distance,
+                    log_bernstein_matrix, points_bezier_curve, tessellate)
+
+def de_casteljau(points, t):
+    points = np.array(points, dtype=float)
+    while len(points) > 1:
+        points = (1 - t) * points[:-1] + t * points[1:]
+    return points[0]
+
+def random_walk(count, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(0.0, 3.0, (count, 2)), axis=0) + 500.0
+
+@pytest.mark.parametrize('degree', [1, 3, 10, STABLE_BERNSTEIN_DEGREE, STABLE_BERNSTEIN_DEGREE + 1, 200, 1000])
+def test_bezier_matches_de_casteljau(degree):
+    points = random_walk(degree + 1)
+    ts = np.linspace(0.0, 1.0, 23)
+    expected = np.array([de_casteljau(points, t) for t in ts])
+    np.testing.assert_allclose(bezier_curve_batch(points, ts), expected, atol=1e-8)
+
+@pytest.mark.parametrize('degree', [100, 2000])
+def test_high_degree_bezier_matches_dense_basis(degree):
+    # Only the control points near degree * t are summed at high degree
+    points = random_walk(degree + 1, seed=1)
+    ts = np.sort(np.random.default_rng(2).uniform(0.0, 1.0, 1000))
+    ts[[0, -1]] = 0.0, 1.0
+    np.testing.assert_allclose(bezier_curve_batch(points, ts), log_bernstein_matrix(degree, ts) @ points, atol=1e-8)
+
+def test_high_degree_bezier_ends_on_the_end_points():
+    points = random_walk(1500)
+    samples = points_bezier_curve(points, 1)
+    np.testing.assert_allclose(samples[[0, -1]], points[[0, -1]], atol=1e-9)
+    assert np.all(np.isfinite(samples))
+
+def test_batched_bezier_curves_match_single_curves():
+    polygons = np.random.default_rng(3).uniform(0.0, 100.0, (5, 40, 2))
+    batch = bezier_curves_batch(polygons, 51)
+    for polygon, samples in zip(polygons, batch):
+        np.testing.assert_allclose(samples, bezier_curve_batch(polygon, np.linspace(0.0, 1.0, 51)), atol=1e-9)
+
+@pytest.mark.parametrize('curve_type', ['Bézier', 'B-spline', 'Catmull-Rom', 'Piecewise cubic'])
+def test_adaptive_tessellation_is_within_tolerance(curve_type):
+    points = np.random.default_rng(4).uniform(0.0, 800.0, (7, 2))
+    tolerance = 0.25
+    parameters, samples = tessellate(points, curve_type, True, tolerance)
+    reference_parameters, reference = tessellate(points, curve_type, True, tolerance / 64)
+    assert np.all(np.diff(parameters) > 0)
+    # Every point of a much finer tessellation lies near the chord between the samples around it
+    segment = np.clip(np.searchsorted(parameters, reference_parameters, side='right') - 1, 0, len(parameters) - 2)
+    distances = chord_distance(reference, samples[segment], samples[segment + 1])
+    assert distances.max() <= 2 * tolerance
+
+def test_adaptive_tessellation_of_a_high_degree_bezier():
+    points = random_walk(3000)
+    parameters, samples = tessellate(points, 'Bézier', True, 0.25)
+    np.testing.assert_allclose(samples, log_bernstein_matrix(len(points) - 1, parameters) @ points, atol=1e-8)
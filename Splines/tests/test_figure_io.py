@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from curve_store import CURVE_TYPES, CurveStore
+from curves import tessellate
+from figure_io import LAZY_CURVE_TYPES, is_binary_figure, read_figure, read_figure_binary, write_figure
+
+def sample_figure():
+    # Every curve type and setting a binary figure keeps, plus curves known only by their samples
+    rng = np.random.default_rng(0)
+    curves = CurveStore()
+    for i, curve_type in enumerate(CURVE_TYPES * 3):
+        control_points = rng.uniform(0.0, 400.0, (rng.integers(3, 9), 2))
+        tolerance = 0.5 if i % 2 else None
+        degree = 2 + i % 3
+        knot_type = ('clamped', 'open', 'uniform')[i % 3]
+        weights = rng.uniform(0.5, 2.0, len(control_points)) if curve_type == 'B-spline' and i % 2 else None
+        points = tessellate(control_points, curve_type, tolerance is not None, tolerance, degree, knot_type, weights)[1]
+        bg_color = (*rng.uniform(0.0, 1.0, 3), 1.0) if i % 4 == 0 else (0.0, 0.0, 0.0, 0.0)
+        curves.append(points, rng.uniform(0.0, 1.0, 3), bg_color, curve_type, control_points, tolerance, degree,
+                      knot_type, weights)
+    curves.append(rng.uniform(0.0, 400.0, (20, 2)), (1.0, 0.0, 0.0))
+    return curves
+
+def assert_same_curves(read, written):
+    assert len(read) == len(written)
+    for a, b in zip(read, written):
+        if b.control_points is None:
+            # Written as a polyline through its samples
+            assert a.type == 'Polyline'
+            np.testing.assert_allclose(a.control_points, b.points, atol=1e-4)
+        else:
+            assert (a.type, a.tolerance, a.degree, a.knot_type) == (b.type, b.tolerance, b.degree, b.knot_type)
+            np.testing.assert_array_equal(a.control_points, b.control_points)
+            if b.weights is None:
+                assert a.weights is None
+            else:
+                np.testing.assert_array_equal(a.weights, b.weights)
+        np.testing.assert_array_equal(a.color, b.color)
+        np.testing.assert_array_equal(a.bg_color, b.bg_color)
+        np.testing.assert_allclose(a.points, b.points, atol=1e-3)
+
+def test_binary_figure_round_trip(tmp_path):
+    curves = sample_figure()
+    file_path = str(tmp_path / 'figure.spf')
+    write_figure(file_path, curves)
+    assert is_binary_figure(file_path)
+    assert_same_curves(read_figure(file_path), curves)
+
+def test_binary_figure_round_trip_twice(tmp_path):
+    # A read figure written again gives the same file
+    first, second = str(tmp_path / 'first.spf'), str(tmp_path / 'second.spf')
+    write_figure(first, sample_figure())
+    write_figure(second, read_figure(first))
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+
+def test_empty_binary_figure(tmp_path):
+    file_path = str(tmp_path / 'empty.spf')
+    write_figure(file_path, CurveStore())
+    assert len(read_figure(file_path)) == 0
+
+def test_lazy_read_matches_eager_read(tmp_path):
+    file_path = str(tmp_path / 'figure.spf')
+    write_figure(file_path, sample_figure())
+    eager, lazy = read_figure_binary(file_path), read_figure_binary(file_path, lazy=True)
+    assert any(curve.lazy for curve in lazy)
+    for a, b in zip(lazy, eager):
+        assert a.lazy == (b.type in LAZY_CURVE_TYPES and (b.weights is None or np.all(b.weights > 0)))
+        # The bounding box of a lazy curve is its control polygon's, which contains the curve
+        box = a.bbox
+        assert np.all(b.points >= box[:2] - 1e-3) and np.all(b.points <= box[2:] + 1e-3)
+        np.testing.assert_array_equal(a.points, b.points)
+        assert not a.lazy
+
+def test_csv_figure_round_trip(tmp_path):
+    # CSV figures only keep the samples
+    pytest.importorskip('pandas')
+    curves = sample_figure()
+    file_path = str(tmp_path / 'figure.csv')
+    write_figure(file_path, curves)
+    read = read_figure(file_path)
+    assert len(read) == len(curves)
+    for a, b in zip(read, curves):
+        np.testing.assert_allclose(a.points, b.points, atol=1e-3)
+        np.testing.assert_allclose(a.color, b.color, atol=1e-6)
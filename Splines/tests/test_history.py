@@ -0,0 +1,51 @@
+from history import POINT_BYTES, Command, History, points_size
+
+def counting_command(name, state, size):
+    return Command(name, lambda: state.append(name), lambda: state.remove(name), size)
+
+def test_undo_and_redo_run_the_commands():
+    state, history = [], History()
+    history.execute(counting_command('a', state, 10))
+    history.execute(counting_command('b', state, 10))
+    assert history.undo().name == 'b'
+    assert state == ['a']
+    assert history.redo().name == 'b'
+    assert state == ['a', 'b']
+    assert history.redo() is None
+
+def test_oldest_entries_are_dropped_over_the_limit():
+    state, history = [], History(max_bytes=100)
+    for name in 'abcde':
+        history.execute(counting_command(name, state, 30))
+    assert [command.name for command in history.undo_stack] == ['c', 'd', 'e']
+    assert history.size == 90
+
+def test_the_last_entry_is_kept_even_over_the_limit():
+    state, history = [], History(max_bytes=100)
+    history.execute(counting_command('a', state, 30))
+    history.execute(counting_command('big', state, 500))
+    assert [command.name for command in history.undo_stack] == ['big']
+    assert history.size == 500
+
+def test_a_new_edit_frees_the_redo_entries():
+    state, history = [], History(max_bytes=100)
+    for name in 'abc':
+        history.execute(counting_command(name, state, 30))
+    history.undo()
+    history.undo()
+    assert history.size == 90  # Undone entries still count until they can't be redone
+    history.execute(counting_command('d', state, 30))
+    assert history.redo_stack == []
+    assert history.size == 60
+
+def test_lowering_the_limit_trims_right_away():
+    state, history = [], History(max_bytes=1000)
+    for name in 'abcd':
+        history.execute(counting_command(name, state, 100))
+    history.set_limit(250)
+    assert [command.name for command in history.undo_stack] == ['c', 'd']
+    history.clear()
+    assert history.size == 0 and not history.undo_stack
+
+def test_points_size():
+    assert points_size([[0.0, 0.0]] * 3) == 3 * POINT_BYTES
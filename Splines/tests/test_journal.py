@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+
+from curve_store import CurveStore, make_curve
+from curves import tessellate
+from journal import FigureJournal, fcntl, generations, journal_path, recover, replay, snapshot_path
+
+def new_curve(seed):
+    rng = np.random.default_rng(seed)
+    control_points = rng.uniform(0.0, 100.0, (4, 2))
+    curve_type = ('Bézier', 'B-spline', 'Catmull-Rom')[seed % 3]
+    return make_curve(tessellate(control_points, curve_type)[1], rng.uniform(0.0, 1.0, 3), (0.0, 0.0, 0.0, 0.0),
+                      curve_type, control_points)
+
+def assert_recovered(directory, curves, points, mode):
+    recovered, recovered_points, recovered_mode = recover(str(directory))
+    assert recovered_mode == mode
+    assert recovered_points == points
+    assert len(recovered) == len(curves)
+    for a, b in zip(recovered, curves):
+        assert a.type == b.type
+        np.testing.assert_allclose(a.control_points, b.control_points)
+        np.testing.assert_allclose(a.color, b.color)
+        np.testing.assert_allclose(a.points, b.points, atol=1e-3)
+
+def test_nothing_to_recover(tmp_path):
+    assert recover(str(tmp_path / 'missing')) is None
+
+def test_recovers_journaled_edits(tmp_path):
+    curves, points = CurveStore(), []
+    journal = FigureJournal(str(tmp_path))
+    journal.compact(curves, points, None)
+    for seed in range(5):
+        curve = new_curve(seed)
+        curves.attach(curve)
+        journal.record_curve(curve)
+    curves.pop()
+    journal.record('pop')
+    points = [[1.0, 2.0], [3.0, 4.0]]
+    journal.record('add_points', points=points)
+    points.append([5.0, 6.0])
+    journal.record('add_point', point=[5.0, 6.0])
+    points[0] = [0.0, 0.0]
+    journal.record('move_point', index=0, point=[0.0, 0.0])
+    points.pop()
+    journal.record('pop_point')
+    journal.record('mode', mode='Bézier')
+    journal.close()
+    assert_recovered(tmp_path, curves, points, 'Bézier')
+
+def test_compaction_starts_a_new_generation(tmp_path):
+    curves, points = CurveStore(), []
+    journal = FigureJournal(str(tmp_path), compact_records=10)
+    journal.compact(curves, points, None)
+    first = journal.generation
+    for seed in range(45):
+        curve = new_curve(seed)
+        curves.attach(curve)
+        journal.record_curve(curve)
+        if journal.due:  # Not while the previous snapshot is still being written
+            points = [[float(seed), 0.0]]
+            journal.compact(curves, points, 'B-spline')
+    journal.close()
+    assert journal.generation > first
+    # Only the newest generation is left, with the curves up to its compaction in the snapshot
+    assert generations(str(tmp_path)) == [journal.generation]
+    assert os.path.exists(snapshot_path(str(tmp_path), journal.generation))
+    assert_recovered(tmp_path, curves, points, 'B-spline')
+
+def test_bulk_change_is_saved_by_the_next_compaction(tmp_path):
+    curves = CurveStore()
+    journal = FigureJournal(str(tmp_path))
+    journal.compact(curves, [], None)
+    loaded = CurveStore()
+    for seed in range(3):
+        loaded.attach(new_curve(seed))
+    curves.extend(loaded)
+    journal.scene_changed()
+    journal.compact(curves, [], None)
+    journal.close()
+    assert_recovered(tmp_path, curves, [], None)
+
+def test_recovery_stops_at_a_bulk_change_whose_snapshot_is_missing(tmp_path):
+    curves = CurveStore()
+    journal = FigureJournal(str(tmp_path))
+    journal.compact(curves, [], None)
+    curve = new_curve(0)
+    curves.attach(curve)
+    journal.record_curve(curve)
+    journal.scene_changed()
+    journal.record('add_point', point=[1.0, 1.0])
+    journal.close()
+    assert_recovered(tmp_path, curves, [], None)
+
+def test_torn_last_line_is_ignored(tmp_path):
+    journal = FigureJournal(str(tmp_path))
+    journal.compact(CurveStore(), [], None)
+    journal.record('add_point', point=[1.0, 1.0])
+    journal.close()
+    with open(journal_path(str(tmp_path), journal.generation), 'a') as file:
+        file.write('{"op":"add_po')
+    assert_recovered(tmp_path, CurveStore(), [[1.0, 1.0]], None)
+
+def test_replaced_points_are_journaled_as_the_change():
+    state = {'kept': 0, 'added': [], 'points': [[0, 0], [1, 1], [2, 2]], 'mode': None}
+    replay(state, [{'op': 'points', 'keep': 1, 'points': [[5, 5]]}])
+    assert state['points'] == [[0, 0], [5, 5]]
+    replay(state, [{'op': 'points', 'keep': 0, 'points': [[7, 7]]}])
+    assert state['points'] == [[7, 7]]
+
+@pytest.mark.skipif(fcntl is None, reason="journal directories are only locked where fcntl exists")
+def test_a_second_editor_cannot_take_the_journal(tmp_path):
+    journal = FigureJournal(str(tmp_path))
+    with pytest.raises(OSError):
+        FigureJournal(str(tmp_path))
+    journal.close()
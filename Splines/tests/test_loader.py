@@ -0,0 +1,55 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from loader import BackgroundLoader
+
+def drain(loader, timeout=60):
+    batches = []
+    deadline = time.perf_counter() + timeout
+    while not loader.done:
+        assert time.perf_counter() < deadline
+        batches.extend(loader.take(4))
+        time.sleep(0.001)
+    return batches
+
+def counting_reader(count):
+    def reader(file_path):
+        for i in range(count):
+            yield np.full((2, 2), i), (i + 1) / count
+    return reader
+
+def test_batches_arrive_in_order():
+    loader = BackgroundLoader(counting_reader(50), 'points.txt', max_pending=4)
+    batches = drain(loader)
+    assert [int(batch[0, 0]) for batch in batches] == list(range(50))
+    assert loader.progress == 1.0 and loader.error is None
+
+def test_cancel_stops_the_reader():
+    stopped = threading.Event()
+
+    def endless_reader(file_path):
+        try:
+            for i in itertools.count():
+                yield np.zeros((1, 2)), 0.5
+        finally:
+            stopped.set()
+
+    loader = BackgroundLoader(endless_reader, 'points.txt', max_pending=2)
+    loader.take(1)
+    loader.cancel()
+    drain(loader)
+    assert stopped.wait(10)
+    assert loader.take(10) == []
+
+def test_error_ends_the_load():
+    def failing_reader(file_path):
+        yield np.zeros((1, 2)), 0.1
+        raise ValueError("bad line")
+
+    loader = BackgroundLoader(failing_reader, 'points.txt')
+    batches = drain(loader)
+    assert len(batches) == 1
+    assert isinstance(loader.error, ValueError)
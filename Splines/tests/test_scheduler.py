@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pytest
+
+from curve_store import CurveStore, make_curve
+from curves import tessellate
+from figure_io import open_figure_binary, read_figure_binary, write_figure
+from renderer import cached_lod_points, has_levels, lod_points
+from scheduler import TessellationScheduler, file_order, priority_order
+
+def write_sample_figure(file_path, count=300):
+    # Curves spread over a 1000 x 1000 square
+    rng = np.random.default_rng(0)
+    curves = CurveStore()
+    for i in range(count):
+        control_points = rng.uniform(0.0, 1000.0, 2) + rng.uniform(-20.0, 20.0, (4, 2))
+        curve_type = ('Bézier', 'B-spline', 'Catmull-Rom')[i % 3]
+        curves.append(tessellate(control_points, curve_type)[1], rng.uniform(0.0, 1.0, 3), (0.0, 0.0, 0.0, 0.0),
+                      curve_type, control_points)
+    write_figure(file_path, curves)
+
+def take_all(scheduler, store, user_curves=()):
+    # Adds every batch to store, with a user curve after each of the first batches; returns the loaded handles
+    loaded, user_curves = [], list(user_curves)
+    deadline = time.perf_counter() + 60
+    while not scheduler.done:
+        assert time.perf_counter() < deadline
+        for batch in scheduler.take(4):
+            added = store.extend(batch)
+            loaded.extend(store.handles[added.start:added.stop])
+            if user_curves:
+                store.attach(user_curves.pop())
+        time.sleep(0.001)
+    return loaded
+
+@pytest.fixture
+def figure(tmp_path):
+    file_path = str(tmp_path / 'figure.spf')
+    write_sample_figure(file_path)
+    return file_path
+
+def test_visible_curves_are_taken_first(figure):
+    bounds = (0.0, 0.0, 300.0, 300.0)
+    scheduler = TessellationScheduler(figure, bounds, workers=1)
+    take_all(scheduler, CurveStore())
+    arrays = open_figure_binary(figure)
+    assert sorted(scheduler.taken) == list(range(len(arrays['types'])))
+    assert scheduler.progress == 1.0 and scheduler.error is None
+    # One worker finishes the chunks in the order they were submitted
+    assert scheduler.taken == priority_order(arrays['control_points'], arrays['offsets'], bounds).tolist()
+    # Visible by the bounding box of the control polygon
+    control_points, offsets = arrays['control_points'], arrays['offsets']
+    lows = np.array([control_points[offsets[i]:offsets[i + 1]].min(axis=0) for i in range(len(offsets) - 1)])
+    visible = np.flatnonzero((lows[:, 0] <= bounds[2]) & (lows[:, 1] <= bounds[3]))
+    assert 0 < len(visible) < len(lows)
+    assert sorted(scheduler.taken[:len(visible)]) == visible.tolist()
+
+def test_file_order_puts_loaded_curves_back(figure):
+    user_curves = [make_curve(np.zeros((2, 2)) + i, (1.0, 0.0, 0.0)) for i in range(3)]
+    scheduler = TessellationScheduler(figure, (400.0, 400.0, 600.0, 600.0), workers=2)
+    store = CurveStore()
+    loaded = take_all(scheduler, store, user_curves)
+    positions = [curve.index for curve in user_curves]
+    store.reorder(file_order(len(store), loaded, scheduler.taken))
+    # The user's curves stay where they were, the loaded ones around them are in file order
+    assert [curve.index for curve in user_curves] == positions
+    in_file_order = [curve for curve in store if curve not in user_curves]
+    for a, b in zip(in_file_order, read_figure_binary(figure)):
+        np.testing.assert_array_equal(a.control_points, b.control_points)
+        np.testing.assert_array_equal(a.points, b.points)
+
+def test_samples_at_the_level_of_detail_are_cached(figure):
+    scheduler = TessellationScheduler(figure, (0.0, 0.0, 1000.0, 1000.0), level=2, workers=2)
+    store = CurveStore()
+    take_all(scheduler, store)
+    for curve in store:
+        if has_levels(curve):
+            np.testing.assert_allclose(cached_lod_points(curve, 2), lod_points(curve, 2), atol=1e-3)
+    assert scheduler.level == 2
+
+def test_cancelled_scheduler_gives_nothing_more(figure):
+    scheduler = TessellationScheduler(figure, (0.0, 0.0, 100.0, 100.0), workers=1)
+    scheduler.cancel()
+    deadline = time.perf_counter() + 60
+    while not scheduler.done:
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+    assert scheduler.take(100) == []
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from spatial import PointGrid
+
+def brute_force_distance(points, x, y, radius):
+    # Distance to the closest point within radius, None if there is none
+    if len(points) == 0:
+        return None
+    distance = np.min(np.hypot(points[:, 0] - x, points[:, 1] - y))
+    return distance if distance <= radius else None
+
+def assert_nearest(grid, points, x, y, radius):
+    index = grid.nearest(x, y, radius)
+    expected = brute_force_distance(points, x, y, radius)
+    if expected is None:
+        assert index is None
+    else:
+        assert np.hypot(*(points[index] - (x, y))) == pytest.approx(expected)
+
+@pytest.mark.parametrize('radius', [5.0, 40.0, 5000.0])
+def test_nearest_matches_brute_force(radius):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0.0, 1000.0, (500, 2))
+    grid = PointGrid()
+    grid.rebuild(points)
+    for x, y in rng.uniform(-100.0, 1100.0, (200, 2)):
+        assert_nearest(grid, points, x, y, radius)
+
+def test_edits_keep_the_grid_in_sync():
+    rng = np.random.default_rng(1)
+    points = rng.uniform(0.0, 300.0, (50, 2))
+    grid = PointGrid()
+    for point in points:
+        grid.append(point)
+    for index in rng.integers(0, len(points), 20):
+        points[index] = rng.uniform(0.0, 300.0, 2)
+        grid.move(index, points[index])
+    for _ in range(10):
+        grid.pop()
+    points = points[:-10]
+    for x, y in rng.uniform(0.0, 300.0, (100, 2)):
+        assert_nearest(grid, points, x, y, 20.0)
+
+def test_empty_grid():
+    grid = PointGrid()
+    grid.rebuild([])
+    assert grid.nearest(0.0, 0.0, 10.0) is None
+    assert grid.nearest(0.0, 0.0, 1e6) is None
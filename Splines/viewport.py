@@ -0,0 +1,53 @@
+import math
+
+from OpenGL.GL import *
+
+# Pan and zoom of the drawing canvas.
+# Curves are stored in world coordinates; at zoom 1 with no pan a world unit is one pixel
+# of the window, as before. The viewport maps window pixels to world coordinates for mouse
+# input and sets up the matching orthographic projection for drawing.
+
+MIN_ZOOM = 1 / 256
+MAX_ZOOM = 256.0
+
+class Viewport:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset(self):
+        self.left = 0.0  # World coordinates of the bottom-left corner of the window
+        self.bottom = 0.0
+        self.zoom = 1.0  # Window pixels per world unit
+
+    def apply(self):
+        left, bottom, right, top = self.bounds()
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glOrtho(left, right, bottom, top, -1.0, 1.0)
+        glMatrixMode(GL_MODELVIEW)
+
+    def bounds(self):
+        # Visible world rectangle (left, bottom, right, top)
+        return (self.left, self.bottom, self.left + self.width / self.zoom, self.bottom + self.height / self.zoom)
+
+    def screen_to_world(self, x, y):
+        # Window pixel (origin at the top-left corner, as pygame reports it) -> world point
+        return [self.left + x / self.zoom, self.bottom + (self.height - y) / self.zoom]
+
+    def zoom_at(self, x, y, factor):
+        # Zoom keeping the world point under window pixel (x, y) in place
+        world_x, world_y = self.screen_to_world(x, y)
+        self.zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self.left = world_x - x / self.zoom
+        self.bottom = world_y - (self.height - y) / self.zoom
+
+    def pan(self, dx, dy):
+        # Move the canvas with the mouse by (dx, dy) window pixels
+        self.left -= dx / self.zoom
+        self.bottom += dy / self.zoom
+
+    def lod_level(self):
+        # Level of detail for the current zoom: 0 at zoom 1, +1 for every doubling
+        return math.floor(math.log2(self.zoom))